@@ -0,0 +1,75 @@
+"""Compares loading a year of expenses with the ISO fast path, with dateutil
+and from the binary ledger.
+
+Run from the repository root:
+    python -m benchmarks.expenses_parse [rows]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import dateutil.parser
+from datetime import date, datetime, timedelta
+
+from tinyexpenses.models import expenses
+from tinyexpenses.models.expenses import ExpenseRecord, YearExpensesReport
+from tinyexpenses.models.file import DbFile, DbCSVWriter
+from tinyexpenses.models.ledger import BinaryLedger
+
+
+def _write_year(db_file: DbFile, rows: int) -> None:
+    start = datetime(2024, 1, 1, 8, 30, 0)
+
+    with DbCSVWriter(db_file, ExpenseRecord.Columns.labels()) as writer:
+        for i in range(rows):
+            timestamp = start + timedelta(minutes=5 * i)
+            writer.write(
+                ExpenseRecord(
+                    timestamp=timestamp,
+                    category=f"Category {i % 40}",
+                    expense_date=date(2024, 1 + i % 12, 1 + i % 28),
+                    amount=(i % 1000) / 7,
+                    description=f"Expense {i}",
+                ).serialize()
+            )
+
+
+def _load_seconds(db_file: DbFile, from_ledger: bool = False) -> float:
+    ledger_path = BinaryLedger.get_file(db_file).get_path()
+    if not from_ledger and os.path.exists(ledger_path):
+        os.unlink(ledger_path)
+
+    started = time.perf_counter()
+    YearExpensesReport(db_file)
+    return time.perf_counter() - started
+
+
+def main(rows: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        db_file = DbFile(os.path.join(directory, "expenses.csv"))
+        db_file.create()
+        _write_year(db_file, rows)
+
+        fast = _load_seconds(db_file)
+
+        fast_paths = (expenses.parse_timestamp, expenses.parse_expense_date)
+        expenses.parse_timestamp = dateutil.parser.parse
+        expenses.parse_expense_date = lambda value: dateutil.parser.parse(value).date()
+        try:
+            slow = _load_seconds(db_file)
+        finally:
+            expenses.parse_timestamp, expenses.parse_expense_date = fast_paths
+
+        # The CSV parse above has left a fresh ledger behind
+        ledger = _load_seconds(db_file, from_ledger=True)
+
+    print(f"rows:          {rows}")
+    print(f"dateutil:      {slow:.3f} s")
+    print(f"fast path:     {fast:.3f} s")
+    print(f"speedup:       {slow / fast:.1f}x")
+    print(f"binary ledger: {ledger:.3f} s ({fast / ledger:.1f}x over fast path)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,83 @@
+import datetime
+import itertools
+import os
+import pytest
+from tinyexpenses import create_app
+from tinyexpenses.extensions import users_db
+from tinyexpenses.models.categories import CategoryRecord
+from tinyexpenses.models.user import Config
+
+PASSWORD = "password"
+CATEGORIES = [
+    ("Food", "Needs"),
+    ("Salary", "Income"),
+    ("Fun", "Wants"),
+    ("Piggy", "Savings"),
+]
+
+_usernames = itertools.count()
+
+
+@pytest.fixture(scope="session")
+def accounts_path(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("accounts"))
+
+
+@pytest.fixture(scope="session")
+def app(accounts_path):
+    class TestConfig:
+        SECRET_KEY = "test-secret"
+        ACCOUNTS_DB_DIRECTORY_PATH = accounts_path
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        RATELIMIT_ENABLED = False
+        # Fast hashes, the tests log in a lot
+        PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+
+    return create_app(TestConfig)
+
+
+@pytest.fixture
+def year():
+    return datetime.date.today().year
+
+
+@pytest.fixture
+def user(app, accounts_path, year):
+    username = f"user{next(_usernames)}"
+    user_directory = os.path.join(accounts_path, username)
+    os.makedirs(user_directory)
+
+    Config.config_file_create_empty(user_directory)
+    config = Config(user_directory)
+    with config.update():
+        config.set_username(username)
+        config.set_password(PASSWORD)
+
+    user = users_db.get(username)
+    user.create_year_expenses(year, 100)
+    user.create_year_categories_file(year)
+    user.store_year_categories(
+        year, [CategoryRecord(category, kind) for category, kind in CATEGORIES]
+    )
+
+    return user
+
+
+@pytest.fixture
+def client(app, user):
+    client = app.test_client()
+    response = client.post("/", data={"username": user.id, "password": PASSWORD})
+    assert response.status_code == 302
+
+    return client
+
+
+@pytest.fixture
+def api_headers(client, user):
+    from tinyexpenses.token import generate_user_token
+
+    with client.application.app_context():
+        token = generate_user_token(user.set_token())
+
+    return {"X-API-Key": token}
@@ -0,0 +1,57 @@
+import random
+import pytest
+from tinyexpenses.expenses_view import (
+    _calculate_yearly_expenses_stats,
+    NUMPY_MIN_CATEGORIES,
+    _use_numpy_engine,
+)
+from tinyexpenses.models.aggregation import YearExpensesMatrix, numpy_available
+from tinyexpenses.models.categories import CategoryType
+from tinyexpenses.models.expenses import YearExpensesTotals
+
+pytestmark = pytest.mark.skipif(not numpy_available(), reason="numpy not installed")
+
+
+def _random_year(rng: random.Random) -> dict:
+    year = {ct: {} for ct in CategoryType}
+
+    for index in range(rng.randint(0, 12)):
+        totals = YearExpensesTotals(
+            [
+                rng.choice([0.0, -0.0, rng.uniform(-1e4, 1e4), round(rng.random(), 2)])
+                for _ in range(12)
+            ]
+        )
+        year[rng.choice(list(CategoryType))][f"category{index}"] = totals
+
+    return year
+
+
+def test_matrix_stats_match_python_loops():
+    rng = random.Random(2024)
+
+    for _ in range(2000):
+        year = _random_year(rng)
+
+        year_totals, monthly_balance, balance_per_type = YearExpensesMatrix(
+            year
+        ).stats()
+        expected = _calculate_yearly_expenses_stats(year)
+
+        assert year_totals == expected[0]
+        assert monthly_balance.totals == expected[1].totals
+        assert {ct: t.totals for ct, t in balance_per_type.items()} == {
+            ct: t.totals for ct, t in expected[2].items()
+        }
+
+
+def test_auto_engine_keeps_small_years_on_python(app):
+    with app.app_context():
+        assert not _use_numpy_engine(10)
+        assert _use_numpy_engine(NUMPY_MIN_CATEGORIES)
+
+        app.config["EXPENSES_STATS_ENGINE"] = "python"
+        try:
+            assert not _use_numpy_engine(10_000)
+        finally:
+            app.config["EXPENSES_STATS_ENGINE"] = "auto"
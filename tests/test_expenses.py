@@ -0,0 +1,244 @@
+import os
+import threading
+import zlib
+from datetime import datetime
+from tinyexpenses.models import expenses
+from tinyexpenses.models.expenses import (
+    ExpenseRecord,
+    YearExpensesReport,
+    YearExpensesSummary,
+)
+from tinyexpenses.models.file import DbFile
+from tinyexpenses.models.ledger import BinaryLedger
+
+
+def _expense(category: str, day: int, amount: float) -> ExpenseRecord:
+    return ExpenseRecord(
+        datetime(2024, 1, day, 12, 0, 0), category, f"2024-03-{day:02}", amount, "x"
+    )
+
+
+def _db_file(tmp_path, expenses: list[ExpenseRecord]) -> DbFile:
+    db_file = DbFile(str(tmp_path / "expenses.csv"))
+    db_file.create()
+    YearExpensesReport.store(db_file, expenses)
+
+    return db_file
+
+
+def _totals(report) -> dict:
+    return {
+        category: totals.totals
+        for category, totals in report.get_expenses_by_category_monthly_totals().items()
+    }
+
+
+def test_appends_are_folded_into_cached_report(tmp_path):
+    db_file = _db_file(tmp_path, [_expense("Food", 1, 12.0)])
+    report = YearExpensesReport(db_file)
+
+    report.insert_expense([_expense("Food", 2, 5.0), _expense("Fun", 3, 1.5)])
+
+    assert _totals(report) == _totals(YearExpensesReport(db_file))
+    assert _totals(report)["Food"][2] == 17.0
+    assert len(report.get_expenses()) == 3
+
+
+def test_own_appends_skip_the_full_reparse(tmp_path, monkeypatch):
+    db_file = _db_file(tmp_path, [_expense("Food", 1, 12.0)])
+    report = YearExpensesReport(db_file)
+
+    def fail():
+        raise AssertionError("reparsed")
+
+    monkeypatch.setattr(report, "_reset", fail)
+    report.insert_expense(_expense("Food", 2, 5.0))
+
+    assert _totals(report)["Food"][2] == 17.0
+
+
+def test_foreign_appends_are_read(tmp_path):
+    db_file = _db_file(tmp_path, [_expense("Food", 1, 12.0)])
+    report = YearExpensesReport(db_file)
+
+    YearExpensesReport(db_file).insert_expense(_expense("Food", 2, 5.0))
+    report.refresh()
+
+    assert _totals(report)["Food"][2] == 17.0
+
+
+def _edit_in_place(db_file: DbFile, old: bytes, new: bytes) -> None:
+    """Same length rewrite keeping the inode and the tail, like a hand edit."""
+    assert len(old) == len(new)
+    path = db_file.get_path()
+    stat = os.stat(path)
+
+    with open(path, "r+b") as file:
+        content = file.read()
+        file.seek(content.index(old))
+        file.write(new)
+
+    # Coarse filesystem clocks could otherwise hide the edit
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_in_place_edit_invalidates_cached_report(tmp_path):
+    db_file = _db_file(tmp_path, [_expense("Food", 1, 12.0), _expense("Food", 2, 5.0)])
+    report = YearExpensesReport(db_file)
+    assert _totals(report)["Food"][2] == 17.0
+
+    _edit_in_place(db_file, b"12.00", b"99.00")
+    report.refresh()
+
+    assert _totals(report)["Food"][2] == 104.0
+
+
+def test_ledger_round_trip(tmp_path):
+    expenses = [_expense("Food", day, day * 1.25) for day in range(1, 20)]
+    db_file = _db_file(tmp_path, expenses)
+
+    YearExpensesReport(db_file).store_ledger()
+    snapshot = BinaryLedger.load(db_file)
+    assert snapshot is not None
+    assert snapshot.signature == db_file.stat_signature()
+
+    loaded = YearExpensesReport(db_file)
+    assert [e.serialize() for e in loaded.get_expenses()] == [
+        e.serialize() for e in expenses
+    ]
+    assert _totals(loaded) == _totals(YearExpensesReport(db_file))
+
+
+def test_ledger_follows_appends_and_rewrites(tmp_path):
+    db_file = _db_file(tmp_path, [_expense("Food", 1, 12.0)])
+    report = YearExpensesReport(db_file)
+
+    report.insert_expense(_expense("Fun", 2, 3.0))
+    assert BinaryLedger.load(db_file).signature == db_file.stat_signature()
+
+    report.modify_expense(0, lambda expense: None)
+    assert BinaryLedger.load(db_file).signature == db_file.stat_signature()
+    assert _totals(YearExpensesReport(db_file)) == {"Fun": [0.0, 0.0, 3.0] + [0.0] * 9}
+
+
+def test_ledger_is_ignored_after_in_place_edit(tmp_path):
+    db_file = _db_file(tmp_path, [_expense("Food", 1, 12.0), _expense("Food", 2, 5.0)])
+    YearExpensesReport(db_file).store_ledger()
+
+    _edit_in_place(db_file, b"12.00", b"99.00")
+
+    report = YearExpensesReport(db_file)
+    assert _totals(report)["Food"][2] == 104.0
+
+    report.store_summary()
+    summary = YearExpensesSummary.load(db_file)
+    assert summary.get_expenses_by_category_monthly_totals()["Food"][2] == 104.0
+
+    # The rewritten ledger describes the edited file
+    assert BinaryLedger.load(db_file).signature == db_file.stat_signature()
+
+
+def test_summary_sidecar_follows_the_csv(tmp_path):
+    db_file = _db_file(tmp_path, [_expense("Food", 1, 12.0)])
+
+    summary = YearExpensesSummary.load(db_file)
+    assert summary.get_expenses_by_category_monthly_totals()["Food"][2] == 12.0
+
+    YearExpensesReport(db_file).insert_expense(_expense("Food", 2, 3.0))
+
+    summary = YearExpensesSummary.load(db_file)
+    assert summary.get_expenses_by_category_monthly_totals()["Food"][2] == 15.0
+
+
+def _crash_during_append(db_file: DbFile, payload: bytes, landed: int) -> None:
+    """Leaves the journal and the first landed bytes, like a crash mid append."""
+    path = db_file.get_path()
+    stat = os.stat(path)
+    header = DbFile.JOURNAL_HEADER.pack(
+        DbFile.JOURNAL_MAGIC,
+        stat.st_size,
+        len(payload),
+        zlib.crc32(payload),
+        stat.st_ino,
+        stat.st_mtime_ns,
+    )
+
+    with open(path + DbFile.JOURNAL_FILE_NAME_SUFFIX, "wb") as journal:
+        journal.write(header + payload)
+
+    with open(path, "ab") as file:
+        file.write(payload[:landed])
+
+
+def test_store_after_crash_is_not_overwritten_by_journal(tmp_path):
+    db_file = _db_file(tmp_path, [_expense("Food", 1, 12.0)])
+    row = _expense("Fun", 2, 7.0).serialize()
+    _crash_during_append(db_file, ",".join(row).encode() + b"\n", landed=0)
+
+    edited = [_expense("Food", 1, 99.0), _expense("Needs", 3, 1.0)]
+    YearExpensesReport.store(db_file, edited)
+
+    assert _totals(YearExpensesReport(db_file)) == {
+        "Food": [0.0, 0.0, 99.0] + [0.0] * 9,
+        "Needs": [0.0, 0.0, 1.0] + [0.0] * 9,
+    }
+
+
+def test_summary_is_not_trusted_over_pending_journal(tmp_path):
+    db_file = _db_file(tmp_path, [_expense("Food", 1, 12.0)])
+    assert YearExpensesSummary.load(db_file) is not None
+
+    row = _expense("Food", 2, 5.0).serialize()
+    _crash_during_append(db_file, ",".join(row).encode() + b"\n", landed=5)
+
+    assert YearExpensesSummary.load(db_file) is None
+    assert _totals(YearExpensesReport(db_file))["Food"][2] == 17.0
+
+
+def test_rows_read_back_as_written(tmp_path):
+    db_file = DbFile(str(tmp_path / "expenses.csv"))
+    with open(db_file.get_path(), "w") as file:
+        file.write("2024-01-02 10:00:00+02:00,Food,2024-03-01,1.005,hand edited\n")
+        file.write("2024-01-02 11:00:00,Food,2024-03-02,2.50,app\n")
+
+    rows = [e.serialize() for e in YearExpensesReport(db_file).get_expenses()]
+    expected = [
+        ["2024-01-02 10:00:00+02:00", "Food", "2024-03-01", "1.005", "hand edited"],
+        ["2024-01-02 11:00:00", "Food", "2024-03-02", "2.50", "app"],
+    ]
+    assert rows == expected
+
+    # Also through the binary ledger and a rewrite of the file
+    YearExpensesReport(db_file).store_ledger()
+    ledger_rows = [e.serialize() for e in YearExpensesReport(db_file).get_expenses()]
+    assert ledger_rows == expected
+
+    YearExpensesReport.store(db_file, YearExpensesReport(db_file).get_expenses())
+    with open(db_file.get_path()) as file:
+        assert file.read().splitlines() == [",".join(row) for row in expected]
+
+
+def test_summary_of_rewrite_is_not_signed_with_racing_append(tmp_path, monkeypatch):
+    db_file = _db_file(tmp_path, [_expense("Food", 1, 1.0)])
+    appender = threading.Thread(
+        target=lambda: YearExpensesReport(db_file).insert_expense(
+            _expense("Food", 2, 50.0)
+        )
+    )
+    writer_exit = expenses.DbCSVAtomicWriter.__exit__
+
+    def exit_and_race(self, *args):
+        result = writer_exit(self, *args)
+        # Give the append every chance to land before the sidecar is written
+        appender.start()
+        appender.join(0.2)
+        return result
+
+    monkeypatch.setattr(expenses.DbCSVAtomicWriter, "__exit__", exit_and_race)
+    YearExpensesReport.store(db_file, [_expense("Food", 1, 1.0)])
+    monkeypatch.undo()
+    appender.join()
+
+    summary = YearExpensesSummary.load(db_file)
+    if summary is not None:
+        assert summary.get_expenses_by_category_monthly_totals()["Food"][2] == 51.0
@@ -0,0 +1,63 @@
+import json
+from tinyexpenses.models.expenses import ExpenseRecord
+
+
+def test_batch_reports_malformed_ndjson_lines_per_item(client, api_headers, user, year):
+    def item(amount, category, day):
+        expense_date = f"{year}-01-{day:02}"
+        return json.dumps(
+            {"amount": amount, "category": category, "expense_date": expense_date}
+        )
+
+    body = "\n".join(
+        [
+            item(1, "Food", 2),
+            '{"amount": 2, "category": ',
+            item(3, "Nope", 2),
+            item(4, "Fun", 3),
+        ]
+    )
+
+    response = client.put(
+        f"/api/v1/{user.id}/expenses/append/batch",
+        data=body,
+        headers={**api_headers, "Content-type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result["status"] == "Partial"
+    assert result["appended"] == 2
+    assert [item["index"] for item in result["results"]] == [0, 1, 2, 3]
+    assert result["results"][1]["status"].startswith("Could not parse:")
+    assert result["results"][3]["status"] == "Ok"
+
+
+def test_batch_rejects_malformed_json_array(client, api_headers, user):
+    response = client.put(
+        f"/api/v1/{user.id}/expenses/append/batch",
+        data="[{",
+        headers={**api_headers, "Content-type": "application/json"},
+    )
+
+    assert response.status_code == 400
+
+
+def test_api_amounts_are_rounded_to_cents(client, api_headers, user, year):
+    response = client.put(
+        f"/api/v1/{user.id}/expenses/append",
+        json={
+            "amount": 33.333333333333336,
+            "category": "Food",
+            "expense_date": f"{year}-01-02",
+        },
+        headers=api_headers,
+    )
+    assert response.status_code == 200
+
+    with client.application.app_context():
+        expenses = user.get_year_expenses(year).get_expenses()
+        (expense,) = [e for e in expenses if e.category == "Food"]
+
+    assert expense.amount == 33.33
+    assert expense.serialize()[ExpenseRecord.Columns.AMOUNT.index] == "33.33"
@@ -0,0 +1,199 @@
+import os
+import signal
+import struct
+import threading
+import zlib
+from tinyexpenses.models.file import DbFile
+
+
+def _db_file(tmp_path, content: bytes) -> DbFile:
+    path = tmp_path / "expenses.csv"
+    path.write_bytes(content)
+
+    return DbFile(str(path))
+
+
+def _write_journal(db_file: DbFile, offset: int, payload: bytes, crc=None) -> None:
+    stat = os.stat(db_file.get_path())
+    header = DbFile.JOURNAL_HEADER.pack(
+        DbFile.JOURNAL_MAGIC,
+        offset,
+        len(payload),
+        zlib.crc32(payload) if crc is None else crc,
+        stat.st_ino,
+        stat.st_mtime_ns,
+    )
+
+    with open(db_file.get_path() + DbFile.JOURNAL_FILE_NAME_SUFFIX, "wb") as journal:
+        journal.write(header + payload)
+
+
+def test_journaled_append(tmp_path):
+    db_file = _db_file(tmp_path, b"a\n")
+    db_file.journaled_append(b"b\n")
+
+    assert db_file.read_bytes(0, 100) == b"a\nb\n"
+    assert not os.path.exists(db_file.get_path() + DbFile.JOURNAL_FILE_NAME_SUFFIX)
+
+
+def test_recover_journal_rolls_forward_partial_append(tmp_path):
+    # The crash left half of the payload in the file
+    db_file = _db_file(tmp_path, b"a\nb")
+    _write_journal(db_file, 2, b"bc\n")
+
+    db_file.recover_journal()
+
+    assert db_file.read_bytes(0, 100) == b"a\nbc\n"
+
+
+def test_recover_journal_discards_torn_journal(tmp_path):
+    db_file = _db_file(tmp_path, b"a\n")
+    _write_journal(db_file, 2, b"b\n", crc=0)
+
+    db_file.recover_journal()
+
+    assert db_file.read_bytes(0, 100) == b"a\n"
+    assert not os.path.exists(db_file.get_path() + DbFile.JOURNAL_FILE_NAME_SUFFIX)
+
+
+def test_recover_journal_discards_truncated_header(tmp_path):
+    db_file = _db_file(tmp_path, b"a\n")
+    path = db_file.get_path() + DbFile.JOURNAL_FILE_NAME_SUFFIX
+    with open(path, "wb") as journal:
+        journal.write(struct.pack("<4s", DbFile.JOURNAL_MAGIC))
+
+    db_file.recover_journal()
+
+    assert db_file.read_bytes(0, 100) == b"a\n"
+    assert not os.path.exists(path)
+
+
+def test_rewrite_drops_stale_journal(tmp_path):
+    # The crash happened before any of the append reached the file
+    db_file = _db_file(tmp_path, b"a\n")
+    _write_journal(db_file, 2, b"b\n")
+
+    db_file.replace_content(b"edited\n")
+    db_file.recover_journal()
+
+    assert db_file.read_bytes(0, 100) == b"edited\n"
+    assert not os.path.exists(db_file.get_path() + DbFile.JOURNAL_FILE_NAME_SUFFIX)
+
+
+def test_recover_journal_ignores_other_files(tmp_path):
+    db_file = _db_file(tmp_path, b"a\n")
+    _write_journal(db_file, 2, b"b\n")
+
+    # Replaced behind the journal's back, as by a restore from another tool
+    other = tmp_path / "other.csv"
+    other.write_bytes(b"c\n")
+    os.replace(other, db_file.get_path())
+    db_file.recover_journal()
+
+    assert db_file.read_bytes(0, 100) == b"c\n"
+
+
+def test_recover_journal_ignores_edited_file(tmp_path):
+    db_file = _db_file(tmp_path, b"a\nb")
+    _write_journal(db_file, 2, b"bc\n")
+
+    # Same inode, but the bytes after the offset are not the journaled ones
+    with open(db_file.get_path(), "r+b") as file:
+        file.seek(2)
+        file.write(b"x")
+    db_file.recover_journal()
+
+    assert db_file.read_bytes(0, 100) == b"a\nx"
+
+
+def test_copy_and_replace(tmp_path):
+    db_file = _db_file(tmp_path, b"x" * 3_000_000)
+    copy = str(tmp_path / "copy.csv")
+
+    db_file.copy_to(copy)
+    db_file.replace_content(b"new")
+    assert db_file.read_bytes(0, 10) == b"new"
+
+    db_file.copy_from(copy)
+    assert os.path.getsize(db_file.get_path()) == 3_000_000
+
+    inode = os.stat(db_file.get_path()).st_ino
+    with db_file.atomic_replace() as file:
+        file.write(b"replaced")
+
+    assert db_file.read_bytes(0, 100) == b"replaced"
+    assert os.stat(db_file.get_path()).st_ino != inode
+    assert DbFile(db_file.get_path() + DbFile.BACKUP_FILE_NAME_SUFFIX).read_bytes(
+        0, 1
+    ) == b"x"
+
+
+def test_sidecar_files_get_no_lock_file(tmp_path):
+    db_file = _db_file(tmp_path, b"a\n")
+
+    with db_file.write_lock():
+        with db_file.read_lock():
+            pass
+
+    assert not os.path.exists(db_file.get_path() + ".lock")
+
+
+def test_ledger_lock_file_is_closed_after_release(tmp_path):
+    path = tmp_path / "expenses.csv"
+    path.write_bytes(b"a\n")
+    db_file = DbFile(str(path), lock_across_processes=True)
+    before = set(os.listdir("/proc/self/fd"))
+
+    with db_file.write_lock():
+        assert len(set(os.listdir("/proc/self/fd")) - before) == 1
+
+    with db_file.read_lock():
+        pass
+
+    assert os.path.exists(str(path) + ".lock")
+    assert set(os.listdir("/proc/self/fd")) == before
+
+
+def test_readers_share_the_ledger_lock(tmp_path):
+    path = tmp_path / "expenses.csv"
+    path.write_bytes(b"a\n")
+    db_file = DbFile(str(path), lock_across_processes=True)
+    entered = threading.Event()
+
+    def read():
+        with db_file.read_lock():
+            entered.set()
+
+    with db_file.read_lock():
+        reader = threading.Thread(target=read)
+        reader.start()
+        assert entered.wait(5)
+
+    reader.join(5)
+
+
+def test_forked_child_does_not_inherit_held_locks(tmp_path):
+    db_file = _db_file(tmp_path, b"a\n")
+    held, done = threading.Event(), threading.Event()
+
+    def hold():
+        with db_file.write_lock():
+            held.set()
+            done.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    held.wait(5)
+
+    pid = os.fork()
+    if pid == 0:
+        # A lock still owned by the parent's thread would block forever
+        signal.alarm(5)
+        with db_file.write_lock():
+            os._exit(0)
+
+    done.set()
+    holder.join(5)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
@@ -0,0 +1,28 @@
+import threading
+from datetime import datetime
+from tinyexpenses.models.expenses import ExpenseRecord, YearExpensesReport
+from tinyexpenses.models.file import DbFile
+from tinyexpenses.models.group_commit import GroupCommitQueue
+
+
+def test_concurrent_appends_all_land(tmp_path):
+    db_file = DbFile(str(tmp_path / "expenses.csv"))
+    db_file.create()
+    report = YearExpensesReport(db_file)
+    queue = GroupCommitQueue(max_batch=8, max_latency=0.01)
+
+    def append(index: int) -> None:
+        queue.append(
+            report,
+            ExpenseRecord(datetime.now(), "Food", "2024-05-01", 1, f"item {index}"),
+        )
+
+    threads = [threading.Thread(target=append, args=(i,)) for i in range(40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    descriptions = [e.description for e in YearExpensesReport(db_file).get_expenses()]
+    assert sorted(descriptions) == sorted(f"item {i}" for i in range(40))
+    assert report.get_expenses_by_category_monthly_totals()["Food"][4] == 40.0
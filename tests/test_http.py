@@ -0,0 +1,137 @@
+import glob
+import os
+
+
+def _append(client, year, category="Food", amount="12.5", day="02-03"):
+    response = client.post(
+        "/expenses/append",
+        data={
+            "category": category,
+            "expense_date": f"{year}-{day}",
+            "amount": amount,
+            "description": "x",
+        },
+    )
+    assert response.status_code == 302
+
+
+def test_year_view_answers_304_until_data_changes(client, year):
+    url = f"/expenses/view/{year}"
+    response = client.get(url)
+    etag = response.headers["ETag"]
+
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    _append(client, year)
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_year_view_ignores_if_modified_since_within_the_same_second(
+    client, accounts_path, user, year
+):
+    url = f"/expenses/view/{year}"
+    _append(client, year)
+    last_modified = client.get(url).headers["Last-Modified"]
+    (path,) = glob.glob(
+        os.path.join(accounts_path, user.id, "**", str(year), "expenses.csv"),
+        recursive=True,
+    )
+    mtime_ns = os.stat(path).st_mtime_ns
+
+    # Second write landing within the same second as the first one
+    _append(client, year, amount="7")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    response = client.get(url, headers={"If-Modified-Since": last_modified})
+
+    assert response.headers["Last-Modified"] == last_modified
+    assert response.status_code == 200
+
+
+def test_row_edits_require_matching_etag(client, year):
+    _append(client, year)
+    rows = client.get(f"/expenses/edit/{year}/rows?category=Food").get_json()
+    row = rows["expenses"][0]
+    url = f"/expenses/edit/{year}/rows/{row['id']}"
+
+    assert client.patch(url, json={"amount": 1}).status_code == 428
+    assert (
+        client.patch(url, json={"amount": 1}, headers={"If-Match": '"stale"'})
+    ).status_code == 412
+
+    response = client.patch(url, json={"amount": 1}, headers={"If-Match": row["etag"]})
+    assert response.status_code == 200
+    assert response.get_json()["expense"]["amount"] == 1.0
+
+    # The old etag no longer describes the row
+    assert (
+        client.delete(url, headers={"If-Match": row["etag"]}).status_code == 412
+    )
+    assert (
+        client.delete(url, headers={"If-Match": response.headers["ETag"]})
+    ).status_code == 200
+
+
+def test_rows_api_pages_with_cursor(client, api_headers, user, year):
+    for day in range(1, 8):
+        _append(client, year, category="Fun", amount=str(day), day=f"06-{day:02}")
+
+    seen = []
+    cursor = None
+    while True:
+        query = "category=Fun&limit=3" + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(
+            f"/api/v1/{user.id}/expenses/{year}?{query}", headers=api_headers
+        ).get_json()
+        seen += [row["amount"] for row in body["expenses"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == [float(day) for day in range(1, 8)]
+
+
+def test_csv_rows_refuse_wildcard_if_match(client, year):
+    _append(client, year)
+    rows = client.get(f"/expenses/edit/{year}/rows?category=Food").get_json()
+    url = f"/expenses/edit/{year}/rows/{rows['expenses'][0]['id']}"
+
+    assert client.delete(url).status_code == 428
+    assert client.delete(url, headers={"If-Match": "*"}).status_code == 428
+
+
+def test_row_edits_move_savings(client, user, year):
+    def balance():
+        # Emptied savings categories are dropped
+        record = user.get_savings().get_by_category().get("Piggy", None)
+        return 0.0 if record is None else record.balance
+
+    _append(client, year, category="Piggy", amount="30")
+    assert balance() == 30.0
+
+    row = client.get(f"/expenses/edit/{year}/rows?category=Piggy").get_json()[
+        "expenses"
+    ][0]
+    url = f"/expenses/edit/{year}/rows/{row['id']}"
+
+    response = client.patch(url, json={"amount": 20}, headers={"If-Match": row["etag"]})
+    assert response.status_code == 200
+    assert balance() == 20.0
+
+    response = client.patch(
+        url, json={"category": "Food"}, headers={"If-Match": response.headers["ETag"]}
+    )
+    assert response.status_code == 200
+    assert balance() == 0.0
+
+    response = client.patch(
+        url, json={"category": "Piggy"}, headers={"If-Match": response.headers["ETag"]}
+    )
+    assert balance() == 20.0
+
+    headers = {"If-Match": response.headers["ETag"]}
+    assert client.delete(url, headers=headers).status_code == 200
+    assert balance() == 0.0
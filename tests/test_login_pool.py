@@ -0,0 +1,45 @@
+import threading
+from tinyexpenses.models.login_pool import LoginWorkerPool
+
+
+class _SlowUser:
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def check_password(self, password: str) -> bool:
+        self.started.set()
+        self.release.wait(5)
+        return password == "password"
+
+
+def test_pool_leaves_a_server_thread_free():
+    pool = LoginWorkerPool(workers=2, max_queue=16, server_threads=4)
+    stats = pool.stats()
+
+    assert stats["workers"] + stats["max_queue"] == 3
+
+    pool.configure(workers=8, max_queue=8, server_threads=1)
+    stats = pool.stats()
+
+    assert (stats["workers"], stats["max_queue"]) == (1, 0)
+
+
+def test_saturated_pool_refuses_checks():
+    pool = LoginWorkerPool(workers=1, max_queue=0, server_threads=4)
+    user = _SlowUser()
+    results = []
+
+    checking = threading.Thread(
+        target=lambda: results.append(pool.check_password(user, "password"))
+    )
+    checking.start()
+    assert user.started.wait(5)
+
+    assert pool.check_password(user, "password") is None
+    assert pool.stats()["rejected"] == 1
+
+    user.release.set()
+    checking.join(5)
+
+    assert results == [True]
@@ -0,0 +1,23 @@
+def test_withdraw_appends_through_the_user(client, user, year, monkeypatch):
+    user.add_to_savings({"Piggy": 50.0})
+    notified = []
+    monkeypatch.setattr(
+        user, "_year_listeners", [lambda user, year: notified.append(year)]
+    )
+
+    response = client.post(
+        "/savings/withdraw",
+        data={
+            "category": "Piggy",
+            "balance": "50",
+            "amount": "20",
+            "year_select": str(year),
+            "submit": "Submit",
+        },
+    )
+
+    assert response.status_code == 302
+    assert notified == [year]
+    assert user.get_savings().get_by_category()["Piggy"].balance == 30.0
+    totals = user.get_year_expenses(year).get_expenses_by_category_monthly_totals()
+    assert sum(totals["Piggy"]) == -20.0
@@ -0,0 +1,44 @@
+import re
+from collections import Counter
+from datetime import date
+from tinyexpenses.models.statements import (
+    CategoryRules,
+    StatementEntry,
+    YearImportTargets,
+    map_categories,
+    to_expenses,
+    write_batches,
+)
+
+
+def test_import_moves_savings_and_notifies_listeners(user, year, monkeypatch):
+    notified = []
+    monkeypatch.setattr(
+        user, "_year_listeners", [lambda user, year: notified.append(year)]
+    )
+
+    entries = [
+        StatementEntry(date(year, 2, 1), -30.0, "to piggy"),
+        StatementEntry(date(year, 2, 2), -5.0, "market"),
+        StatementEntry(date(year, 2, 3), -20.0, "to piggy"),
+    ]
+    rules = CategoryRules(
+        [(re.compile("piggy"), "Piggy"), (re.compile("market"), "Food")], None
+    )
+    stats = Counter()
+    targets = YearImportTargets(user)
+
+    for _ in write_batches(
+        to_expenses(map_categories(entries, rules, stats), targets, stats),
+        targets,
+        batch_size=2,
+        stats=stats,
+    ):
+        pass
+
+    assert stats["imported"] == 3
+    assert notified == [year, year]
+    assert user.get_savings().get_by_category()["Piggy"].balance == 50.0
+    assert user.get_year_expenses(year).get_expenses_by_category_monthly_totals()[
+        "Food"
+    ][1] == 5.0
@@ -0,0 +1,43 @@
+from datetime import datetime
+from tinyexpenses.models.categories import CategoryRecord
+from tinyexpenses.models.expenses import ExpenseRecord
+from tinyexpenses.models.savings import SavingRecord
+from tinyexpenses.models.sqlite_storage import SqliteStorage
+from tinyexpenses.models.storage import CsvStorage, copy_storage
+
+
+def _fill(storage) -> None:
+    storage.create_year_categories(2024)
+    storage.store_year_categories(
+        2024, [CategoryRecord("Food", "Needs"), CategoryRecord("Piggy", "Savings")]
+    )
+    storage.create_year_expenses(2024)
+    storage.store_year_expenses(
+        2024,
+        [
+            ExpenseRecord(datetime(2024, 1, 1), "Food", "2024-01-02", 3.5, "a"),
+            ExpenseRecord(datetime(2024, 2, 1), "Piggy", "2024-02-02", 10, "b"),
+        ],
+    )
+    storage.store_savings([SavingRecord("Piggy", "Bank", 10)])
+
+
+def _dump(storage) -> tuple:
+    return (
+        [list(c) for c in storage.get_year_categories(2024).get_categories()],
+        [e.serialize() for e in storage.get_year_expenses(2024).get_expenses()],
+        [r.serialize() for r in storage.get_savings().get_records()],
+    )
+
+
+def test_copy_between_backends(tmp_path):
+    csv = CsvStorage(str(tmp_path / "csv"))
+    _fill(csv)
+
+    sqlite = SqliteStorage(str(tmp_path / "sqlite"))
+    assert copy_storage(csv, sqlite) == {"categories": 2, "expenses": 2, "savings": 1}
+    assert _dump(sqlite) == _dump(csv)
+
+    back = CsvStorage(str(tmp_path / "back"))
+    copy_storage(sqlite, back)
+    assert _dump(back) == _dump(csv)
@@ -0,0 +1,37 @@
+from datetime import datetime
+from tinyexpenses.models.expenses import ExpenseRecord
+
+
+def test_year_without_initial_balance_opens_from_previous_close(
+    client, api_headers, user, year
+):
+    next_year = year + 1
+    user.append_expenses(
+        year,
+        user.get_year_expenses(year),
+        ExpenseRecord(datetime.now(), "Food", f"{year}-12-01", 30.0, "x"),
+    )
+    user.create_year_expenses(next_year, 0)
+    user.create_year_categories_file(next_year, year)
+    user.store_year_expenses(
+        next_year,
+        [ExpenseRecord(datetime.now(), "Salary", f"{next_year}-01-05", 10.0, "x")],
+    )
+
+    response = client.get(
+        f"/api/v1/{user.id}/expenses/summary?from={year}-12&to={next_year}-01",
+        headers=api_headers,
+    )
+
+    assert response.status_code == 200
+    december, january = response.get_json()["months"]
+    assert december["closing_balance"] == 70.0
+    assert january["opening_balance"] == 70.0
+    assert january["closing_balance"] == 80.0
+
+    # The previous year is looked up even outside the requested range
+    response = client.get(
+        f"/api/v1/{user.id}/expenses/summary?from={next_year}-01&to={next_year}-01",
+        headers=api_headers,
+    )
+    assert response.get_json()["months"][0]["opening_balance"] == 70.0
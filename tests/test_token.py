@@ -0,0 +1,39 @@
+from tinyexpenses import token
+
+
+def test_verified_tokens_are_keyed_by_token_only(app):
+    with app.app_context():
+        signed = token.generate_user_token("user-token")
+
+        assert token.verify_user_token(signed) == "user-token"
+        assert signed in token._verified_tokens
+        assert all(
+            app.config["SECRET_KEY"] not in key for key in token._verified_tokens
+        )
+
+
+def test_verified_tokens_are_dropped_with_the_secret(app):
+    secret_key = app.config["SECRET_KEY"]
+
+    with app.app_context():
+        signed = token.generate_user_token("user-token")
+        assert token.verify_user_token(signed) == "user-token"
+
+        app.config["SECRET_KEY"] = secret_key + "-rotated"
+        try:
+            assert token.verify_user_token(signed) is None
+        finally:
+            app.config["SECRET_KEY"] = secret_key
+
+        assert token.verify_user_token(signed) == "user-token"
+
+
+def test_revoked_token_is_refused(client, user, year, api_headers):
+    url = f"/api/v1/{user.id}/expenses/{year}"
+
+    assert client.get(url, headers=api_headers).status_code == 200
+
+    with client.application.app_context():
+        user.set_token()
+
+    assert client.get(url, headers=api_headers).status_code == 401
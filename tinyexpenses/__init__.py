@@ -1,5 +1,16 @@
-from .extensions import login_manager, users_db, format_number, app
+from .extensions import (
+    login_manager,
+    users_db,
+    login_pool,
+    fragment_cache,
+    context_cache,
+    format_number,
+    app,
+)
+from .models.user import Config
 from .routes import bp
+from . import token
+from .expenses_view import schedule_year_context
 
 
 def create_app(config_class=None):
@@ -12,6 +23,45 @@ def create_app(config_class=None):
     login_manager.init_app(app)
 
     app.jinja_env.filters["format_number"] = format_number
+    users_db.expenses_cache.set_max_bytes(
+        app.config.get(
+            "EXPENSES_CACHE_MAX_BYTES", users_db.expenses_cache.DEFAULT_MAX_BYTES
+        )
+    )
+    fragment_cache.set_max_bytes(
+        app.config.get("FRAGMENT_CACHE_MAX_BYTES", fragment_cache.DEFAULT_MAX_BYTES)
+    )
+    context_cache.set_max_items(
+        app.config.get(
+            "VIEW_CONTEXT_CACHE_MAX_ITEMS", context_cache.DEFAULT_MAX_ITEMS
+        )
+    )
+    users_db.append_queue.configure(
+        app.config.get(
+            "EXPENSES_APPEND_MAX_BATCH", users_db.append_queue.DEFAULT_MAX_BATCH
+        ),
+        app.config.get(
+            "EXPENSES_APPEND_MAX_LATENCY_MS",
+            users_db.append_queue.DEFAULT_MAX_LATENCY * 1000,
+        )
+        / 1000,
+    )
+    token.configure_verified_tokens(
+        app.config.get("API_TOKEN_CACHE_MAX_ITEMS", token.VERIFIED_TOKENS_MAX_ITEMS),
+        app.config.get("API_TOKEN_CACHE_TTL", token.VERIFIED_TOKENS_TTL),
+    )
+    Config.set_password_hash_method(
+        app.config.get("PASSWORD_HASH_METHOD", Config.PASSWORD_HASH_METHOD)
+    )
+    login_pool.configure(
+        app.config.get("LOGIN_WORKERS", login_pool.DEFAULT_WORKERS),
+        app.config.get("LOGIN_MAX_QUEUE", login_pool.DEFAULT_MAX_QUEUE),
+        app.config.get("SERVER_THREADS", login_pool.DEFAULT_SERVER_THREADS),
+    )
+    users_db.storage_backend = app.config.get(
+        "STORAGE_BACKEND", users_db.storage_backend
+    )
+    users_db.add_year_listener(schedule_year_context)
     users_db.load(app.config["ACCOUNTS_DB_DIRECTORY_PATH"])
 
     app.register_blueprint(bp)
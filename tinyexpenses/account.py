@@ -55,8 +55,9 @@ def _handle_details_change(user: AppUser, form: UserDetailsForm) -> None:
     if not form.validate_on_submit():
         flash("Request could not be validated.", FlashType.ERROR.name)
 
-    user.set_full_name(form.full_name.data)
-    user.set_currency(form.currency.data)
+    with user.update_config():
+        user.set_full_name(form.full_name.data)
+        user.set_currency(form.currency.data)
 
     flash("Details changed.", FlashType.INFO.name)
 
@@ -1,10 +1,10 @@
 from .models.accounts import AppUser
 from .django_http import url_has_allowed_host_and_scheme
-from flask import abort, render_template, request, redirect, url_for
+from flask import abort, current_app, render_template, request, redirect, url_for
 from flask_wtf import FlaskForm
 from flask_login import login_user, logout_user
 from wtforms import StringField, PasswordField, SubmitField, BooleanField, validators
-from .extensions import login_manager, users_db
+from .extensions import login_manager, users_db, login_pool
 
 
 class LoginForm(FlaskForm):
@@ -34,7 +34,20 @@ def auth_authenticate_post():
     if user is None:
         return render_template("login.html", form=form)
 
-    if not user.check_password(form.password.data):
+    password_valid = login_pool.check_password(user, form.password.data)
+
+    if password_valid is None:
+        current_app.logger.warning("Login refused, pool busy: %s", login_pool.stats())
+        return (
+            render_template(
+                "login.html",
+                form=form,
+                infos=[("error", "Too many login attempts, try again shortly")],
+            ),
+            503,
+        )
+
+    if not password_valid:
         return render_template(
             "login.html", form=form, infos=[("error", "Invalid username/password")]
         )
@@ -2,14 +2,14 @@ from flask import render_template, redirect, url_for
 from flask_login import current_user
 from .models.accounts import AppUser
 from .extensions import users_db
-from .models.categories import YearCategories, CategoryRecord
+from .models.categories import CategoryRecord
 from .csv_edit import render_csv_data_edit_form, handle_csv_data_edit
 
 
 def _store_categories_data_cb(ctx: dict, data: str):
     categories = [CategoryRecord(*row) for row in data]
 
-    YearCategories.store(ctx["db_file"], categories)
+    ctx["user"].store_year_categories(ctx["year"], categories)
 
 
 def categories_edit_post(year: int):
@@ -18,13 +18,12 @@ def categories_edit_post(year: int):
     if requested_user is None:
         return render_template("error.html", message="User not found.")
 
-    db_file = requested_user._get_year_categories_file(year)
-    if not db_file.exists():
+    if not requested_user.has_year_categories(year):
         return redirect(url_for("main.categories_create", year=year))
     return handle_csv_data_edit(
         url_for("main.categories_edit", year=year),
         _store_categories_data_cb,
-        {"db_file": db_file},
+        {"user": requested_user, "year": year},
     )
 
 
@@ -1,7 +1,23 @@
 import os
+import time
 import click
+from collections import Counter
 
-from tinyexpenses.models.accounts import Config
+from tinyexpenses.models.accounts import AppUser, Config
+from tinyexpenses.models.storage import copy_storage, get_storage_class
+from tinyexpenses.models.statements import (
+    CategoryRules,
+    YearImportTargets,
+    dedupe,
+    map_categories,
+    read_csv_statement,
+    read_ofx_statement,
+    to_expenses,
+    write_batches,
+)
+
+
+STORAGE_BACKENDS = ["csv", "sqlite"]
 
 
 @click.group()
@@ -29,9 +45,10 @@ def init_user(users_root, username, full_name, password):
 
     config = Config(user_dir)
 
-    config.set_username(username)
-    config.set_full_name(full_name)
-    config.set_password(password)
+    with config.update():
+        config.set_username(username)
+        config.set_full_name(full_name)
+        config.set_password(password)
 
     click.echo(f"✅ User '{username}' initialized at {user_dir}")
 
@@ -54,5 +71,123 @@ def reset_password(users_root, username, new_password):
     click.echo(f"✅ Password reset for user '{username}'")
 
 
+@main.command("import")
+@click.argument("users_root", type=click.Path(exists=True, file_okay=False))
+@click.argument("username", type=str)
+@click.argument("statement", type=click.Path(exists=True, dir_okay=False))
+@click.option("--rules", required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "statement_format", type=click.Choice(["csv", "ofx"]))
+@click.option("--date-column", default="Date", show_default=True)
+@click.option("--amount-column", default="Amount", show_default=True)
+@click.option("--description-column", default="Description", show_default=True)
+@click.option("--delimiter", default=",", show_default=True)
+@click.option("--date-format", default=None, help="strptime format, ISO by default.")
+@click.option("--batch-size", default=1000, show_default=True)
+@click.option("--dry-run", is_flag=True, help="Parse and match without writing.")
+@click.option(
+    "--storage",
+    type=click.Choice(STORAGE_BACKENDS),
+    default="csv",
+    envvar="STORAGE_BACKEND",
+    show_default=True,
+)
+def import_statement(
+    users_root,
+    username,
+    statement,
+    rules,
+    statement_format,
+    date_column,
+    amount_column,
+    description_column,
+    delimiter,
+    date_format,
+    batch_size,
+    dry_run,
+    storage,
+):
+    """Import a CSV or OFX bank STATEMENT into USERNAME's expenses."""
+    user_dir = os.path.join(users_root, username)
+
+    if not Config.config_file_exists(user_dir):
+        click.echo(f"❌ Error: user config does not exist at {user_dir}.")
+        return
+
+    if statement_format is None:
+        statement_format = "ofx" if statement.lower().endswith(".ofx") else "csv"
+
+    if statement_format == "ofx":
+        entries = read_ofx_statement(statement)
+    else:
+        entries = read_csv_statement(
+            statement,
+            date_column,
+            amount_column,
+            description_column,
+            delimiter,
+            date_format,
+        )
+
+    stats = Counter()
+    targets = YearImportTargets(
+        AppUser(id=username, user_directory=user_dir, storage_backend=storage)
+    )
+
+    # Every stage is a generator, only one batch per year is held in memory
+    mapped = map_categories(entries, CategoryRules.load(rules), stats)
+    expenses = dedupe(to_expenses(mapped, targets, stats), targets, stats)
+
+    started = time.monotonic()
+    for progress in write_batches(expenses, targets, batch_size, stats, dry_run):
+        elapsed = max(time.monotonic() - started, 1e-9)
+        click.echo(
+            f"… imported {progress['imported']} rows ({progress['imported'] / elapsed:,.0f} rows/s)"
+        )
+
+    click.echo(
+        f"✅ Imported {stats['imported']}, duplicates {stats['duplicate']}, "
+        f"unmatched {stats['unmatched']}, unknown category {stats['unknown_category']}, "
+        f"missing year {stats['missing_year']}{' (dry run)' if dry_run else ''}"
+    )
+
+
+@main.command("migrate-storage")
+@click.argument("users_root", type=click.Path(exists=True, file_okay=False))
+@click.option("--from", "source", type=click.Choice(STORAGE_BACKENDS), default="csv")
+@click.option("--to", "target", type=click.Choice(STORAGE_BACKENDS), default="sqlite")
+@click.option("--username", default=None, help="Only this user, all by default.")
+def migrate_storage(users_root, source, target, username):
+    """Copy the ledgers in USERS_ROOT from one storage backend to another."""
+    if source == target:
+        click.echo("❌ Error: source and target storage are the same.")
+        return
+
+    if username is None:
+        usernames = sorted(
+            entry.name for entry in os.scandir(users_root) if entry.is_dir()
+        )
+    else:
+        usernames = [username]
+
+    for name in usernames:
+        user_dir = os.path.join(users_root, name)
+
+        if not Config.config_file_exists(user_dir):
+            if username is not None:
+                click.echo(f"❌ Error: user config does not exist at {user_dir}.")
+            continue
+
+        app_path = os.path.join(user_dir, AppUser.APP_DIRECTORY)
+        copied = copy_storage(
+            get_storage_class(source)(app_path), get_storage_class(target)(app_path)
+        )
+
+        click.echo(
+            f"✅ {name}: {copied['expenses']} expenses, "
+            f"{copied['categories']} categories, {copied['savings']} savings "
+            f"copied from {source} to {target}"
+        )
+
+
 if __name__ == "__main__":
     main()
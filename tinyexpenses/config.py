@@ -7,6 +7,43 @@ class Config:
         "ACCOUNTS_DB_DIRECTORY_PATH", "accounts"
     )
     REMEMBER_COOKIE_DURATION = timedelta(days=30)
+    # "csv" keeps hand editable files per year, "sqlite" one database per user
+    STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "csv")
+    EXPENSES_CACHE_MAX_BYTES = int(
+        os.environ.get("EXPENSES_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    )
+    # Rendered year and month tables, reused until their data changes
+    FRAGMENT_CACHE_MAX_BYTES = int(
+        os.environ.get("FRAGMENT_CACHE_MAX_BYTES", 16 * 1024 * 1024)
+    )
+    # Computed year totals shared by the year, month and balance views
+    VIEW_CONTEXT_CACHE_MAX_ITEMS = int(
+        os.environ.get("VIEW_CONTEXT_CACHE_MAX_ITEMS", 256)
+    )
+    # "auto" uses numpy when installed and a year has at least the given number
+    # of categories, below it the setup costs more than the loops it replaces.
+    # "python" or "numpy" force an engine
+    EXPENSES_STATS_ENGINE = os.environ.get("EXPENSES_STATS_ENGINE", "auto")
+    EXPENSES_STATS_NUMPY_MIN_CATEGORIES = int(
+        os.environ.get("EXPENSES_STATS_NUMPY_MIN_CATEGORIES", 100)
+    )
+    EXPENSES_BATCH_MAX_ITEMS = int(os.environ.get("EXPENSES_BATCH_MAX_ITEMS", 1000))
+    # API appends to one file arriving within the latency are written together
+    EXPENSES_APPEND_MAX_BATCH = int(os.environ.get("EXPENSES_APPEND_MAX_BATCH", 256))
+    EXPENSES_APPEND_MAX_LATENCY_MS = float(
+        os.environ.get("EXPENSES_APPEND_MAX_LATENCY_MS", 2)
+    )
+    # Verified X-API-Key headers skip the signature check until they expire
+    API_TOKEN_CACHE_MAX_ITEMS = int(os.environ.get("API_TOKEN_CACHE_MAX_ITEMS", 1024))
+    API_TOKEN_CACHE_TTL = float(os.environ.get("API_TOKEN_CACHE_TTL", 300))
+    # Stored hashes made with another method are upgraded on the next login
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+    # Threads of the WSGI server, Waitress uses 4 unless told otherwise
+    SERVER_THREADS = int(os.environ.get("SERVER_THREADS", 4))
+    # Concurrent password checks, and how many more may wait before refusing.
+    # Both block a server thread, together they are capped at SERVER_THREADS - 1
+    LOGIN_WORKERS = int(os.environ.get("LOGIN_WORKERS", 2))
+    LOGIN_MAX_QUEUE = int(os.environ.get("LOGIN_MAX_QUEUE", 1))
 
 
 class ProductionHTTPConfig(Config):
@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+
+class YearContextCache:
+    """LRU of computed year view contexts, each kept with its data version.
+
+    Writes schedule the recomputation on a background thread, so the view
+    following an append usually finds its context ready.
+    """
+
+    DEFAULT_MAX_ITEMS = 256
+
+    def __init__(self, max_items: int = DEFAULT_MAX_ITEMS):
+        self._lock = threading.Lock()
+        self._max_items = max_items
+        self._contexts: OrderedDict[tuple, tuple[object, dict]] = OrderedDict()
+        # Keys waiting for a recomputation, a burst of writes queues one
+        self._scheduled: set[tuple] = set()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="year-context"
+        )
+
+    def set_max_items(self, max_items: int) -> None:
+        with self._lock:
+            self._max_items = max_items
+            self._evict()
+
+    def get(self, key: tuple, version) -> dict | None:
+        with self._lock:
+            cached = self._contexts.get(key, None)
+
+            if cached is None or cached[0] != version:
+                return None
+
+            self._contexts.move_to_end(key)
+            return cached[1]
+
+    def put(self, key: tuple, version, context: dict) -> dict:
+        with self._lock:
+            self._contexts[key] = (version, context)
+            self._contexts.move_to_end(key)
+            self._evict()
+
+        return context
+
+    def schedule(self, key: tuple, compute: Callable[[], object]) -> None:
+        with self._lock:
+            if key in self._scheduled:
+                return
+
+            self._scheduled.add(key)
+
+        self._executor.submit(self._run, key, compute)
+
+    def _run(self, key: tuple, compute: Callable[[], object]) -> None:
+        # Unmarked first, a write landing while computing schedules another run
+        with self._lock:
+            self._scheduled.discard(key)
+
+        try:
+            compute()
+        except Exception:
+            # Only a warm up, the next view computes and reports it again
+            pass
+
+    def _evict(self) -> None:
+        while len(self._contexts) > max(0, self._max_items):
+            self._contexts.popitem(last=False)
@@ -6,6 +6,7 @@ from flask import (
     flash,
     jsonify,
     request,
+    current_app,
 )
 from flask_login import current_user
 from flask_wtf import FlaskForm
@@ -21,10 +22,11 @@ from wtforms import (
 
 from tinyexpenses.models.accounts import AppUser
 from .models.categories import YearCategories, CategoryType
-from .models.expenses import ExpenseRecord
+from .models.expenses import ExpenseRecord, round_amount
 from .extensions import users_db
 from .models.flash import FlashType, flash_collect
 from datetime import datetime, date
+from collections import defaultdict
 
 
 class AppendExpenseForm(FlaskForm):
@@ -76,14 +78,7 @@ def expenses_append_get():
 
 
 def _update_savings(requested_user: AppUser, category: str, amount: float):
-    savings = requested_user.get_savings()
-
-    saving_record = savings.get_by_category().get(category, None)
-    if saving_record is not None:
-        amount += saving_record.balance
-
-    savings.update(category, None, amount)
-    savings.store()
+    requested_user.add_to_savings({category: amount})
 
     flash("Updated savings.", FlashType.INFO.name)
 
@@ -95,8 +90,9 @@ def expenses_append_post():
         return render_template("error.html", message="User not found.")
 
     # Currently we support adding expenses only to current year
-    year_expenses = requested_user.get_year_expenses(datetime.now().year)
-    year_categories = requested_user.get_year_categories(datetime.now().year)
+    current_year = datetime.now().year
+    year_expenses = requested_user.get_year_expenses(current_year)
+    year_categories = requested_user.get_year_categories(current_year)
 
     form = AppendExpenseForm()
     form.populate_category_choices(year_categories)
@@ -114,13 +110,13 @@ def expenses_append_post():
             timestamp=datetime.now().isoformat(),
             category=form.category.data,
             expense_date=form.expense_date.data,
-            amount=form.amount.data,
+            amount=round_amount(form.amount.data),
             description=form.description.data,
         )
 
-        year_expenses.insert_expense(expense)
+        requested_user.append_expenses(current_year, year_expenses, expense)
 
-        if expense.category in year_categories[CategoryType.SAVINGS]:
+        if expense.category in year_categories.get_names(CategoryType.SAVINGS):
             _update_savings(requested_user, expense.category, expense.amount)
 
     except FileNotFoundError:
@@ -132,6 +128,16 @@ def expenses_append_post():
     return redirect(url_for("main.expenses_append"))
 
 
+def _parse_api_expense(user_request_data: dict) -> ExpenseRecord:
+    return ExpenseRecord(
+        timestamp=datetime.now().isoformat(),
+        amount=round_amount(user_request_data["amount"]),
+        category=user_request_data["category"],
+        expense_date=user_request_data.get("expense_date", datetime.now().date()),
+        description=user_request_data.get("description", ""),
+    )
+
+
 def expenses_append_api_put(username):
     if request.headers.get("Content-type", "") != "application/json":
         return jsonify({"status": "Content-type nor supported."}), 400
@@ -142,15 +148,7 @@ def expenses_append_api_put(username):
         return jsonify({"status": "Unauthorized"}), 401
 
     try:
-        user_request_data = json.loads(request.data.decode())
-
-        expense = ExpenseRecord(
-            timestamp=datetime.now().isoformat(),
-            amount=user_request_data["amount"],
-            category=user_request_data["category"],
-            expense_date=user_request_data.get("expense_date", datetime.now().date()),
-            description=user_request_data.get("description", ""),
-        )
+        expense = _parse_api_expense(json.loads(request.data.decode()))
     except Exception as e:
         return jsonify(
             {
@@ -169,9 +167,7 @@ def expenses_append_api_put(username):
     try:
         year_categories = requested_user.get_year_categories(expense.expense_date.year)
 
-        available_categories = list(
-            map(lambda item: item.category, year_categories.get_categories())
-        )
+        available_categories = year_categories.get_type_by_category()
     except Exception:
         return jsonify(
             {
@@ -195,9 +191,11 @@ def expenses_append_api_put(username):
         ), 500
 
     try:
-        year_expenses.insert_expense(expense)
+        requested_user.append_expenses(
+            expense.expense_date.year, year_expenses, expense
+        )
 
-        if expense.category in year_categories[CategoryType.SAVINGS]:
+        if expense.category in year_categories.get_names(CategoryType.SAVINGS):
             _update_savings(requested_user, expense.category, expense.amount)
     except Exception:
         return jsonify(
@@ -207,3 +205,127 @@ def expenses_append_api_put(username):
         ), 500
 
     return jsonify({"status": "Ok"}), 200
+
+
+def _read_batch_items():
+    """Yields (item, error) pairs, a malformed NDJSON line fails only its item."""
+    content_type = request.headers.get("Content-type", "")
+
+    if content_type == "application/json":
+        items = json.loads(request.data.decode())
+        if not isinstance(items, list):
+            raise ValueError("Expected a JSON array of expenses.")
+
+        for item in items:
+            yield item, None
+
+    elif content_type == "application/x-ndjson":
+        # Consume the body line by line instead of buffering it whole
+        for line in request.stream:
+            if not line.strip():
+                continue
+
+            try:
+                yield json.loads(line.decode()), None
+            except ValueError as e:
+                yield None, e
+
+    else:
+        raise ValueError("Content-type nor supported.")
+
+
+def expenses_append_batch_api_put(username):
+    requested_user = users_db.get(username)
+
+    if requested_user is None:
+        return jsonify({"status": "Unauthorized"}), 401
+
+    current_year = datetime.now().date().year
+    max_items = current_app.config.get("EXPENSES_BATCH_MAX_ITEMS", 1000)
+
+    try:
+        year_categories = requested_user.get_year_categories(current_year)
+    except Exception:
+        return jsonify(
+            {"status": f"Could not load categories for given year {current_year}."}
+        ), 500
+
+    available_categories = year_categories.get_type_by_category()
+    savings_categories = year_categories.get_names(CategoryType.SAVINGS)
+
+    results = []
+    accepted: list[tuple[int, ExpenseRecord]] = []
+
+    try:
+        for index, (item, error) in enumerate(_read_batch_items()):
+            if index >= max_items:
+                return jsonify(
+                    {"status": f"Batch exceeds the limit of {max_items} expenses."}
+                ), 413
+
+            if error is not None:
+                results.append({"index": index, "status": f"Could not parse: {error}"})
+                continue
+
+            try:
+                expense = _parse_api_expense(item)
+            except Exception as e:
+                results.append({"index": index, "status": f"Could not parse: {e}"})
+                continue
+
+            if expense.expense_date.year != current_year:
+                results.append(
+                    {
+                        "index": index,
+                        "status": f"Cannot add expense for year {expense.expense_date.year}.",
+                    }
+                )
+                continue
+
+            if expense.category not in available_categories:
+                results.append(
+                    {
+                        "index": index,
+                        "status": f"Category does exists for given year {current_year}",
+                    }
+                )
+                continue
+
+            results.append({"index": index, "status": "Ok"})
+            accepted.append((index, expense))
+    except Exception as e:
+        return jsonify(
+            {"status": "Could not parse request.", "exception:": f"{e}"}
+        ), 400
+
+    if accepted:
+        expenses = [expense for _, expense in accepted]
+
+        try:
+            year_expenses = requested_user.get_year_expenses(current_year)
+            # One journaled write for the whole batch
+            requested_user.append_expenses(current_year, year_expenses, expenses)
+        except Exception:
+            return jsonify(
+                {
+                    "status": f"Could not append expense file for given year {current_year}."
+                }
+            ), 500
+
+        savings_deltas = defaultdict(float)
+        for expense in expenses:
+            if expense.category in savings_categories:
+                savings_deltas[expense.category] += expense.amount
+
+        if savings_deltas:
+            try:
+                requested_user.add_to_savings(savings_deltas)
+            except Exception:
+                return jsonify(
+                    {"status": "Expenses appended, but savings could not be updated."}
+                ), 500
+
+    status = "Ok" if len(accepted) == len(results) else "Partial"
+    return jsonify(
+        {"status": status, "appended": len(accepted), "results": results}
+    ), 200
@@ -2,14 +2,14 @@ from flask import render_template, redirect, url_for
 from flask_login import current_user
 from .models.accounts import AppUser
 from .extensions import users_db
-from .models.expenses import YearExpensesReport, ExpenseRecord
+from .models.expenses import ExpenseRecord
 from .csv_edit import render_csv_data_edit_form, handle_csv_data_edit
 
 
 def _store_expenses_data_cb(ctx: dict, data: str):
     expenses = [ExpenseRecord(*row) for row in data]
 
-    YearExpensesReport.store(ctx["db_file"], expenses)
+    ctx["user"].store_year_expenses(ctx["year"], expenses)
 
 
 def expenses_edit_post(year: int):
@@ -18,15 +18,13 @@ def expenses_edit_post(year: int):
     if requested_user is None:
         return render_template("error.html", message="User not found.")
 
-    db_file = requested_user._get_year_expenses_file(year)
-
-    if not db_file.exists():
+    if not requested_user.has_year_expenses(year):
         return redirect(url_for("main.expenses_create", year=year))
     
     return handle_csv_data_edit(
-        url_for("main.expenses_edit", year=year),
+        url_for("main.expenses_edit_csv", year=year),
         _store_expenses_data_cb,
-        {"db_file": db_file},
+        {"user": requested_user, "year": year},
     )
 
 
@@ -0,0 +1,257 @@
+import hashlib
+from flask import jsonify, render_template, redirect, request, url_for
+from flask_login import current_user
+from .models.accounts import AppUser
+from .models.categories import CategoryType
+from .models.expenses import (
+    ExpenseFilter,
+    ExpenseRecord,
+    parse_amount,
+    parse_expense_date,
+    round_amount,
+)
+from .models.flash import flash_collect
+from .django_http import parse_etags, quote_etag
+from .extensions import users_db
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+# In the order ExpenseRecord iterates over its values
+FIELDS = ("timestamp", "category", "expense_date", "amount", "description")
+
+
+class _PreconditionFailed(Exception):
+    pass
+
+
+def _row_etag(expense: ExpenseRecord) -> str:
+    digest = hashlib.blake2b(
+        "\x1f".join(expense.serialize()).encode(), digest_size=8
+    ).hexdigest()
+
+    return quote_etag(digest)
+
+
+def _serialize_row(row: int, expense: ExpenseRecord) -> dict:
+    serialized = expense.serialize()
+
+    return {
+        "id": row,
+        "etag": _row_etag(expense),
+        "timestamp": serialized[ExpenseRecord.Columns.TIMESTAMP.index],
+        "category": expense.category,
+        "expense_date": serialized[ExpenseRecord.Columns.EXPENSE_DATE.index],
+        "amount": expense.amount,
+        "description": expense.description,
+    }
+
+
+def _parse_filter() -> ExpenseFilter:
+    def optional(name, parse):
+        value = request.args.get(name, "").strip()
+        return parse(value) if value else None
+
+    return ExpenseFilter(
+        date_from=optional("date_from", parse_expense_date),
+        date_to=optional("date_to", parse_expense_date),
+        category=optional("category", str),
+        amount_min=optional("amount_min", parse_amount),
+        amount_max=optional("amount_max", parse_amount),
+        text=optional("text", str),
+    )
+
+
+def _list_rows(user: AppUser, year: int):
+    try:
+        expense_filter = _parse_filter()
+        after = int(request.args.get("cursor", -1))
+        limit = min(max(int(request.args.get("limit", DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except Exception as e:
+        return jsonify({"status": f"Could not parse query: {e}"}), 400
+
+    try:
+        # One extra row tells whether another page exists
+        rows = user.list_expenses(year, expense_filter, after, limit + 1)
+    except FileNotFoundError:
+        return jsonify(
+            {"status": f"Could not load expenses for given year {year}."}
+        ), 404
+
+    return jsonify(
+        {
+            "status": "Ok",
+            "expenses": [_serialize_row(*row) for row in rows[:limit]],
+            "next_cursor": str(rows[limit - 1][0]) if len(rows) > limit else None,
+        }
+    ), 200
+
+
+def _modify_row(user: AppUser, year: int, row: int, changes: dict | None):
+    """Applies changes to the row, None deletes it. The row must match If-Match."""
+    if_match = request.headers.get("If-Match", None)
+    if if_match is None:
+        return jsonify({"status": "If-Match with the row etag is required."}), 428
+
+    etags = parse_etags(if_match)
+
+    # Positional ids shift on deletes, only the row etag proves the target
+    if "*" in etags and not user.get_storage().STABLE_ROW_IDS:
+        return jsonify({"status": "If-Match with the row etag is required."}), 428
+
+    if changes is not None:
+        unknown = set(changes) - set(FIELDS)
+        if unknown:
+            return jsonify({"status": f"Unknown fields: {sorted(unknown)}."}), 400
+
+        if not isinstance(changes.get("description", ""), str):
+            return jsonify({"status": "Description must be a text."}), 400
+
+        if "category" in changes:
+            try:
+                categories = user.get_year_categories(year).get_type_by_category()
+            except FileNotFoundError:
+                categories = {}
+
+            if changes["category"] not in categories:
+                return jsonify(
+                    {"status": f"Category does not exist for given year {year}."}
+                ), 400
+
+    previous = []
+
+    def change(current: ExpenseRecord) -> ExpenseRecord | None:
+        if "*" not in etags and _row_etag(current) not in etags:
+            raise _PreconditionFailed()
+
+        previous.append(current)
+
+        if changes is None:
+            return None
+
+        fields = dict(zip(FIELDS, current))
+        fields.update(changes)
+        # Untouched amounts keep whatever precision the file has
+        if "amount" in changes:
+            fields["amount"] = round_amount(changes["amount"])
+        replacement = ExpenseRecord(**fields)
+
+        # Every year has its own file, moving rows between them is an append
+        if replacement.expense_date.year != year:
+            raise ValueError(f"Expense date must stay within {year}.")
+
+        return replacement
+
+    try:
+        replacement = user.modify_expense(year, row, change)
+    except FileNotFoundError:
+        return jsonify(
+            {"status": f"Could not load expenses for given year {year}."}
+        ), 404
+    except KeyError:
+        return jsonify({"status": f"Expense {row} does not exist."}), 404
+    except _PreconditionFailed:
+        return jsonify({"status": "Expense was changed meanwhile, reload it."}), 412
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": f"Could not parse: {e}"}), 400
+
+    try:
+        _update_savings(user, year, previous[-1], replacement)
+    except ValueError as e:
+        return jsonify(
+            {"status": f"Expense changed, but savings could not follow: {e}"}
+        ), 409
+
+    if replacement is None:
+        return jsonify({"status": "Ok"}), 200
+
+    response = jsonify({"status": "Ok", "expense": _serialize_row(row, replacement)})
+    response.headers["ETag"] = _row_etag(replacement)
+
+    return response, 200
+
+
+def _update_savings(
+    user: AppUser,
+    year: int,
+    previous: ExpenseRecord,
+    replacement: ExpenseRecord | None,
+) -> None:
+    """Moves savings balances like appending the replacement and undoing previous."""
+    try:
+        savings_categories = user.get_year_categories(year).get_names(
+            CategoryType.SAVINGS
+        )
+    except FileNotFoundError:
+        return
+
+    deltas: dict[str, float] = {}
+
+    if previous.category in savings_categories:
+        deltas[previous.category] = -previous.amount
+
+    if replacement is not None and replacement.category in savings_categories:
+        deltas[replacement.category] = (
+            deltas.get(replacement.category, 0.0) + replacement.amount
+        )
+
+    deltas = {category: delta for category, delta in deltas.items() if delta != 0.0}
+    if deltas:
+        user.add_to_savings(deltas)
+
+
+def expenses_rows_api_get(username: str, year: int):
+    requested_user = users_db.get(username)
+
+    if requested_user is None:
+        return jsonify({"status": "Unauthorized"}), 401
+
+    return _list_rows(requested_user, year)
+
+
+def expenses_row_api_patch(username: str, year: int, row: int):
+    requested_user = users_db.get(username)
+
+    if requested_user is None:
+        return jsonify({"status": "Unauthorized"}), 401
+
+    changes = request.get_json(silent=True)
+    if not isinstance(changes, dict) or not changes:
+        return jsonify({"status": "Could not parse request."}), 400
+
+    return _modify_row(requested_user, year, row, changes)
+
+
+def expenses_row_api_delete(username: str, year: int, row: int):
+    requested_user = users_db.get(username)
+
+    if requested_user is None:
+        return jsonify({"status": "Unauthorized"}), 401
+
+    return _modify_row(requested_user, year, row, None)
+
+
+def expenses_rows_edit_get(year: int):
+    requested_user: AppUser | None = users_db.get(current_user.id)
+
+    if requested_user is None:
+        return render_template("error.html", message="User not found.")
+
+    if not requested_user.has_year_expenses(year):
+        return redirect(url_for("main.expenses_create", year=year))
+
+    try:
+        categories = [
+            record.category
+            for record in requested_user.get_year_categories(year).get_categories()
+        ]
+    except FileNotFoundError:
+        categories = []
+
+    return render_template(
+        "expenses_edit.html",
+        year=year,
+        categories=categories,
+        col_labels=ExpenseRecord.Columns.labels(),
+        title=f"{year} expenses editor",
+        infos=flash_collect(),
+    )
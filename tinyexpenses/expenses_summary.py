@@ -0,0 +1,188 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import render_template, request, jsonify
+from flask_login import current_user
+from .models.accounts import AppUser
+from .models.categories import CategoryType
+from .extensions import users_db
+from .expenses_view import prepare_year_context
+
+# Parsing is I/O and csv bound, a few workers are enough to overlap years
+_year_loader = ThreadPoolExecutor(max_workers=4, thread_name_prefix="expenses-summary")
+
+
+def _parse_month(value: str) -> tuple[int, int]:
+    parsed = datetime.strptime(value, "%Y-%m")
+    return parsed.year, parsed.month
+
+
+def _parse_range(
+    user: AppUser, range_from: str | None, range_to: str | None
+) -> tuple[tuple[int, int], tuple[int, int]]:
+    now = datetime.now()
+    available_years = user.get_available_expenses_files()
+
+    if range_from is None:
+        first_year = available_years[0] if available_years else now.year
+        range_from = f"{first_year}-01"
+
+    if range_to is None:
+        range_to = f"{now.year}-{now.month:02d}"
+
+    start = _parse_month(range_from)
+    end = _parse_month(range_to)
+
+    if start > end:
+        raise ValueError("Range start must not be after its end.")
+
+    return start, end
+
+
+def _load_year(user: AppUser, year: int):
+    try:
+        return user.get_year_summary(year), user.get_year_categories(year)
+    except FileNotFoundError:
+        return None, None
+
+
+def _has_initial_balance(report) -> bool:
+    totals = report.get_expenses_by_category_monthly_totals()
+    return CategoryType.INITIAL_BALANCE_LABEL.value in totals
+
+
+def _closing_balance(user: AppUser, year: int) -> float:
+    if year not in user.get_available_expenses_files():
+        return 0.0
+
+    report, categories = _load_year(user, year)
+    if report is None:
+        return 0.0
+
+    context = prepare_year_context(user, report, categories, year)
+    return _opening_balance(user, year, report, {}) + sum(context["monthly_balance"])
+
+
+def _opening_balance(
+    user: AppUser, year: int, report, closing_balances: dict[int, float]
+) -> float:
+    """The Initial Balance row, or without one the previous year's closing balance."""
+    if _has_initial_balance(report):
+        return report.initial_balance
+
+    if year - 1 in closing_balances:
+        return closing_balances[year - 1]
+
+    return _closing_balance(user, year - 1)
+
+
+def _summarize(user: AppUser, start: tuple[int, int], end: tuple[int, int]) -> dict:
+    years = [
+        year
+        for year in user.get_available_expenses_files()
+        if start[0] <= year <= end[0]
+    ]
+
+    expense_types = [
+        ct
+        for ct in CategoryType
+        if ct not in (CategoryType.INCOME, CategoryType.INITIAL_BALANCE_LABEL)
+    ]
+
+    months = []
+    totals = {ct.name.lower(): 0.0 for ct in (CategoryType.INCOME, *expense_types)}
+    totals["balance"] = 0.0
+    missing_years = []
+    closing_balances: dict[int, float] = {}
+
+    # map() yields in year order as soon as each year is parsed, so merging
+    # overlaps with loading of the following years
+    loaded = _year_loader.map(lambda year: _load_year(user, year), years)
+
+    for year, (report, categories) in zip(years, loaded):
+        if report is None:
+            missing_years.append(year)
+            continue
+
+        context = prepare_year_context(user, report, categories, year)
+        per_type = context["balance_per_type"]
+        monthly_balance = context["monthly_balance"]
+
+        balance = _opening_balance(user, year, report, closing_balances)
+
+        for month in range(12):
+            opening_balance = balance
+            balance += monthly_balance[month]
+
+            if not start <= (year, month + 1) <= end:
+                continue
+
+            entry = {
+                "month": f"{year}-{month + 1:02d}",
+                "opening_balance": round(opening_balance, 2),
+                "closing_balance": round(balance, 2),
+                "balance": round(monthly_balance[month], 2),
+            }
+
+            for ct in (CategoryType.INCOME, *expense_types):
+                key = ct.name.lower()
+                entry[key] = round(per_type[ct][month], 2)
+                totals[key] += per_type[ct][month]
+
+            totals["balance"] += monthly_balance[month]
+            months.append(entry)
+
+        closing_balances[year] = balance
+
+    return {
+        "from": f"{start[0]}-{start[1]:02d}",
+        "to": f"{end[0]}-{end[1]:02d}",
+        "months": months,
+        "totals": {key: round(value, 2) for key, value in totals.items()},
+        "missing_years": missing_years,
+    }
+
+
+def expenses_summary_get():
+    requested_user: AppUser | None = users_db.get(current_user.id)
+
+    if requested_user is None:
+        return render_template("error.html", message="User not found.")
+
+    try:
+        start, end = _parse_range(
+            requested_user, request.args.get("from"), request.args.get("to")
+        )
+    except ValueError:
+        return render_template(
+            "error.html", message="Invalid range, expected YYYY-MM."
+        ), 400
+
+    summary = _summarize(requested_user, start, end)
+
+    return render_template(
+        "expenses_summary.html",
+        summary=summary,
+        currency=requested_user.currency,
+        title=f"{summary['from']} - {summary['to']} summary",
+    )
+
+
+def expenses_summary_api_get(username):
+    requested_user = users_db.get(username)
+
+    if requested_user is None:
+        return jsonify({"status": "Unauthorized"}), 401
+
+    try:
+        start, end = _parse_range(
+            requested_user, request.args.get("from"), request.args.get("to")
+        )
+    except ValueError:
+        return jsonify({"status": "Invalid range, expected YYYY-MM."}), 400
+
+    try:
+        summary = _summarize(requested_user, start, end)
+    except Exception:
+        return jsonify({"status": "Could not read expenses or categories."}), 500
+
+    return jsonify({"status": "Ok", **summary}), 200
@@ -1,19 +1,21 @@
-from flask import render_template, redirect, url_for, jsonify
+from flask import render_template, redirect, url_for, jsonify, current_app
 from flask_login import current_user
 from .models.expenses import YearExpensesTotals
 from .models.categories import CategoryType
-from .extensions import users_db
+from .models.aggregation import YearExpensesMatrix, numpy_available
+from .extensions import app, users_db, fragment_cache, context_cache
+from . import http_cache
 import calendar
 from datetime import datetime
 
 
 def _sort_monthly_expenses_by_category_types(expenses_by_category, categories):
     result = {ct: {} for ct in CategoryType}
+    type_by_category = categories.get_type_by_category()
     for category, expenses in expenses_by_category.items():
-        for ct in CategoryType:
-            if category in categories[ct]:
-                result[ct][category] = expenses
-                break
+        ct = type_by_category.get(category, None)
+        if ct is not None:
+            result[ct][category] = expenses
     return result
 
 
@@ -36,6 +38,25 @@ def _calculate_yearly_expenses_stats(
     return year_totals, monthly_balance, balance_per_type
 
 
+# Measured crossover is around 60 categories, numpy only pays off well above
+NUMPY_MIN_CATEGORIES = 100
+
+
+def _use_numpy_engine(category_count: int) -> bool:
+    engine = current_app.config.get("EXPENSES_STATS_ENGINE", "auto")
+
+    if engine == "numpy":
+        return True
+
+    min_categories = current_app.config.get(
+        "EXPENSES_STATS_NUMPY_MIN_CATEGORIES", NUMPY_MIN_CATEGORIES
+    )
+
+    return (
+        engine == "auto" and category_count >= min_categories and numpy_available()
+    )
+
+
 def _get_user_or_abort(user_id):
     user = users_db.get(user_id)
     if user is None:
@@ -45,7 +66,7 @@ def _get_user_or_abort(user_id):
 
 def _load_year_data(user, year):
     try:
-        report = user.get_year_expenses(year)
+        report = user.get_year_summary(year)
     except FileNotFoundError:
         return None, None, redirect(url_for("main.expenses_create", year=year))
 
@@ -57,18 +78,97 @@ def _load_year_data(user, year):
     return report, categories, None
 
 
+def _load_year_context(user, year):
+    key = (user.id, year)
+    version = (tuple(user.get_year_signatures(year)), user.currency)
+
+    context = context_cache.get(key, version)
+    if context is not None:
+        return context, None
+
+    report, categories, redirect_response = _load_year_data(user, year)
+    if redirect_response:
+        return None, redirect_response
+
+    context = prepare_year_context(user, report, categories, year)
+    return context_cache.put(key, version, context), None
+
+
+def schedule_year_context(user, year: int) -> None:
+    """Recomputes the context of a changed year off the request thread."""
+
+    def compute():
+        with app.app_context():
+            _load_year_context(user, year)
+
+    context_cache.schedule((user.id, year), compute)
+
+
+def _get_year_version(user, year) -> tuple:
+    # Taken before loading, a write racing the render only costs a re-render
+    return (
+        tuple(user.get_year_signatures(year)),
+        user.get_config_signature(),
+        tuple(user.get_available_expenses_files()),
+    )
+
+
+def _get_year_validators(user, year, version, *parts) -> http_cache.Validators:
+    signatures, config_signature, available_years = version
+
+    return http_cache.get_validators(
+        [*signatures, config_signature], user.id, year, available_years, *parts
+    )
+
+
+def _get_year_table(user, year, version, template_name, **template_args):
+    key = (user.id, year, template_name, tuple(template_args.items()))
+    version = (version, user.currency)
+
+    table = fragment_cache.get(key, version)
+    if table is not None:
+        return table, None
+
+    context, redirect_response = _load_year_context(user, year)
+    if redirect_response:
+        return None, redirect_response
+
+    table = render_template(
+        template_name,
+        year=year,
+        expenses_monthly_totals_by_category_type=context["expenses_by_type"],
+        year_totals=context["year_totals"],
+        monthly_balance=context["monthly_balance"],
+        monthly_balance_per_category_type=context["balance_per_type"],
+        currency=context["currency"],
+        available_years=user.get_available_expenses_files(),
+        current_balance=context["current_balance"],
+        CategoryType=CategoryType,
+        month_names=calendar.month_name[1:],
+        **template_args,
+    )
+
+    return fragment_cache.put(key, version, table), None
+
+
 def _complete_missing_categories(data, categories):
     for record in categories.get_categories():
         data.setdefault(record.category, YearExpensesTotals())
 
 
-def _prepare_context(user, report, categories, year):
+def prepare_year_context(user, report, categories, year):
+    """Totals of a year grouped by category type, as the year views show them."""
     data = report.get_expenses_by_category_monthly_totals()
     _complete_missing_categories(data, categories)
     grouped = _sort_monthly_expenses_by_category_types(data, categories)
-    year_totals, monthly_balance, balance_per_type = _calculate_yearly_expenses_stats(
-        grouped
-    )
+    if _use_numpy_engine(len(data)):
+        year_totals, monthly_balance, balance_per_type = YearExpensesMatrix(
+            grouped
+        ).stats()
+    else:
+        year_totals, monthly_balance, balance_per_type = (
+            _calculate_yearly_expenses_stats(grouped)
+        )
 
     return {
         "expenses_by_type": grouped,
@@ -85,25 +185,21 @@ def expenses_view_year_get(year: int):
     if error:
         return error
 
-    report, categories, redirect_response = _load_year_data(user, year)
+    version = _get_year_version(user, year)
+    validators = _get_year_validators(user, year, version, "year")
+    if http_cache.is_not_modified(validators):
+        return http_cache.not_modified_response(validators)
+
+    table, redirect_response = _get_year_table(
+        user, year, version, "expenses_view_year_table.html"
+    )
     if redirect_response:
         return redirect_response
 
-    context = _prepare_context(user, report, categories, year)
-    return render_template(
-        "expenses_view_year.html",
-        year=year,
-        expenses_monthly_totals_by_category_type=context["expenses_by_type"],
-        year_totals=context["year_totals"],
-        monthly_balance=context["monthly_balance"],
-        monthly_balance_per_category_type=context["balance_per_type"],
-        currency=context["currency"],
-        title=f"{year} expenses",
-        available_years=user.get_available_expenses_files(),
-        current_balance=context["current_balance"],
-        CategoryType=CategoryType,
-        month_names=calendar.month_name[1:],
+    page = render_template(
+        "expenses_view_year.html", table=table, title=f"{year} expenses"
     )
+    return http_cache.with_validators(page, validators)
 
 
 def expenses_view_month_get(year: int, month: int):
@@ -114,26 +210,21 @@ def expenses_view_month_get(year: int, month: int):
     if month not in range(1, len(calendar.month_name)):
         return render_template("error.html", message="Invalid month."), 400
 
-    report, categories, redirect_response = _load_year_data(user, year)
+    version = _get_year_version(user, year)
+    validators = _get_year_validators(user, year, version, "month", month)
+    if http_cache.is_not_modified(validators):
+        return http_cache.not_modified_response(validators)
+
+    table, redirect_response = _get_year_table(
+        user, year, version, "expenses_view_month_table.html", month=month - 1
+    )
     if redirect_response:
         return redirect_response
 
-    context = _prepare_context(user, report, categories, year)
-    return render_template(
-        "expenses_view_month.html",
-        year=year,
-        month=month - 1,
-        expenses_monthly_totals_by_category_type=context["expenses_by_type"],
-        year_totals=context["year_totals"],
-        monthly_balance=context["monthly_balance"],
-        monthly_balance_per_category_type=context["balance_per_type"],
-        currency=context["currency"],
-        title=f"{month}/{year} expenses",
-        available_years=user.get_available_expenses_files(),
-        current_balance=context["current_balance"],
-        CategoryType=CategoryType,
-        month_names=calendar.month_name[1:],
+    page = render_template(
+        "expenses_view_month.html", table=table, title=f"{month}/{year} expenses"
     )
+    return http_cache.with_validators(page, validators)
 
 
 def expenses_view_balance_api_get(username, year):
@@ -146,15 +237,25 @@ def expenses_view_balance_api_get(username, year):
     except Exception:
         year = datetime.now().date().year
 
+    validators = _get_year_validators(
+        user, year, _get_year_version(user, year), "balance"
+    )
+    if http_cache.is_not_modified(validators):
+        return http_cache.not_modified_response(validators)
+
     try:
-        report = user.get_year_expenses(year)
-        categories = user.get_year_categories(year)
+        context, _ = _load_year_context(user, year)
     except Exception:
+        context = None
+
+    if context is None:
         return jsonify(
             {"status": f"Could not read expenses or categories for year {year}."}
         ), 500
 
-    context = _prepare_context(user, report, categories, year)
-    return jsonify(
-        {"status": "Ok", "balance": round(float(context["current_balance"]), 2)}
+    return http_cache.with_validators(
+        jsonify(
+            {"status": "Ok", "balance": round(float(context["current_balance"]), 2)}
+        ),
+        validators,
     ), 200
@@ -5,6 +5,9 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask import Blueprint
 from .models.accounts import Users
+from .models.login_pool import LoginWorkerPool
+from .fragment_cache import FragmentCache
+from .context_cache import YearContextCache
 
 app = Flask(__name__, instance_relative_config=True)
 
@@ -16,6 +19,12 @@ csrf = CSRFProtect(app)
 
 users_db = Users()
 
+login_pool = LoginWorkerPool()
+
+fragment_cache = FragmentCache()
+
+context_cache = YearContextCache()
+
 limiter = Limiter(
     get_remote_address,
     app=app,
@@ -0,0 +1,60 @@
+import threading
+from collections import OrderedDict
+from markupsafe import Markup
+
+
+class FragmentCache:
+    """Process-wide LRU of rendered HTML fragments.
+
+    Every key holds a single version, the one of the data it was rendered
+    from. A fragment rendered after a write replaces the stale one in place.
+    """
+
+    DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self._lock = threading.Lock()
+        self._max_bytes = max_bytes
+        self._fragments: OrderedDict[tuple, tuple[object, Markup]] = OrderedDict()
+        self._total_bytes = 0
+
+    def set_max_bytes(self, max_bytes: int) -> None:
+        with self._lock:
+            self._max_bytes = max_bytes
+            self._evict()
+
+    def get(self, key: tuple, version) -> Markup | None:
+        with self._lock:
+            cached = self._fragments.get(key, None)
+
+            if cached is None or cached[0] != version:
+                return None
+
+            self._fragments.move_to_end(key)
+            return cached[1]
+
+    def put(self, key: tuple, version, fragment: str) -> Markup:
+        fragment = Markup(fragment)
+
+        with self._lock:
+            self._discard(key)
+            self._fragments[key] = (version, fragment)
+            # Rendered tables are mostly ASCII, characters approximate bytes
+            self._total_bytes += len(fragment)
+            self._evict()
+
+        return fragment
+
+    def invalidate(self, key: tuple) -> None:
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key: tuple) -> None:
+        cached = self._fragments.pop(key, None)
+        if cached is not None:
+            self._total_bytes -= len(cached[1])
+
+    def _evict(self) -> None:
+        while self._total_bytes > self._max_bytes and self._fragments:
+            _, (_, fragment) = self._fragments.popitem(last=False)
+            self._total_bytes -= len(fragment)
@@ -0,0 +1,66 @@
+import hashlib
+from dataclasses import dataclass
+from flask import Response, make_response, request
+from .django_http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+
+@dataclass
+class Validators:
+    etag: str | None
+    last_modified: int | None
+
+
+def get_validators(signatures: list, *parts) -> Validators:
+    """Validators of a response rendered only from the files behind the signatures.
+
+    parts carries whatever else the response depends on, like the route and
+    its arguments.
+    """
+    etag = hashlib.blake2b(repr((parts, signatures)).encode(), digest_size=16)
+
+    mtimes = [signature[0] for signature in signatures if signature is not None]
+    # Whole seconds, as If-Modified-Since sends them back
+    last_modified = max(mtimes) // 1_000_000_000 if mtimes else None
+
+    return Validators(quote_etag(etag.hexdigest()), last_modified)
+
+
+def is_not_modified(validators: Validators) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+
+    # RFC 7232: If-Modified-Since is ignored when If-None-Match is present
+    if if_none_match is not None:
+        etags = parse_etags(if_none_match)
+        return validators.etag in etags or "*" in etags
+
+    # Last-Modified has whole seconds, two writes within one would look the
+    # same, so dates are only trusted for responses without an ETag
+    if validators.etag is not None:
+        return False
+
+    if_modified_since = parse_http_date_safe(
+        request.headers.get("If-Modified-Since", "")
+    )
+
+    return (
+        if_modified_since is not None
+        and validators.last_modified is not None
+        and validators.last_modified <= if_modified_since
+    )
+
+
+def not_modified_response(validators: Validators) -> Response:
+    return with_validators(Response(status=304), validators)
+
+
+def with_validators(response, validators: Validators) -> Response:
+    response = make_response(response)
+
+    if validators.etag is not None:
+        response.headers["ETag"] = validators.etag
+    if validators.last_modified is not None:
+        response.headers["Last-Modified"] = http_date(validators.last_modified)
+    # Per user data, browsers must revalidate before reusing it
+    response.headers["Cache-Control"] = "private, no-cache"
+
+    return response
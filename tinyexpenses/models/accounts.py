@@ -1,26 +1,36 @@
 import os
+import hmac
 import secrets
+import threading
 import dateutil
 from datetime import datetime
+from typing import Callable
 from .file import DbFile
 from .user import Config, User
-from .expenses import ExpenseRecord, YearExpensesReport
+from .expenses import (
+    ExpenseFilter,
+    ExpenseRecord,
+    YearExpensesReport,
+    YearExpensesSummary,
+    round_amount,
+)
 from .savings import Savings
-from .categories import CategoryType, YearCategories
+from .categories import CategoryType, CategoryRecord, YearCategories
+from .group_commit import GroupCommitQueue
+from .storage import CsvStorage, Storage, YearExpensesCache, get_storage_class
 
 
 class TinyExpensesConfig(Config):
     def __init__(self, directory):
         super().__init__(directory)
 
-        if self._data.get("tinyexpenses", None) is None:
-            self._data["tinyexpenses"] = {
+        self._app_config = self._data.setdefault(
+            "tinyexpenses",
+            {
                 "currency": "",
                 "api_token": "",
-            }
-            self._save()
-
-        self._app_config = self._data["tinyexpenses"]
+            },
+        )
 
     def get_currency(self) -> str:
         return self._app_config.get("currency", "")
@@ -35,19 +45,39 @@ class TinyExpensesConfig(Config):
         return self.get_token()
 
     def get_token(self):
-        return self._data["tinyexpenses"].get("api_token", None)
+        return self._app_config.get("api_token", None)
+
+    def check_token(self, token: str) -> bool:
+        api_token = self.get_token()
+
+        # Users that never generated a token have none to match
+        if not api_token:
+            return False
+
+        return hmac.compare_digest(api_token.encode(), token.encode())
 
 
 class AppUser(User):
-    EXPENSES_FILE_NAME = "expenses.csv"
-    CATEGORIES_FILE_NAME = "categories.csv"
-    SAVINGS_FILE_NAME = "savings.csv"
     APP_DIRECTORY = "tinyexpenses"
 
-    def __init__(self, id, user_directory):
+    def __init__(
+        self,
+        id,
+        user_directory,
+        expenses_cache: YearExpensesCache | None = None,
+        append_queue: GroupCommitQueue | None = None,
+        storage_backend: str = CsvStorage.NAME,
+        year_listeners: list[Callable[["AppUser", int], None]] | None = None,
+    ):
         super().__init__(id, TinyExpensesConfig(user_directory))
 
         self._app_path = os.path.join(user_directory, self.APP_DIRECTORY)
+        self._storage: Storage = get_storage_class(storage_backend)(
+            self._app_path, expenses_cache
+        )
+        self._append_queue = append_queue
+        # Called with the user and year after each change to a year's data
+        self._year_listeners = [] if year_listeners is None else year_listeners
 
     @property
     def currency(self):
@@ -62,60 +92,102 @@ class AppUser(User):
     def get_token(self):
         return self._config.get_token()
 
-    def get_available_expenses_files(self) -> list[int]:
-        if not os.path.exists(self._app_path):
-            return []
+    def check_token(self, token: str) -> bool:
+        return self._config.check_token(token)
 
-        available_years = []
+    def _notify_year(self, year: int) -> None:
+        for listener in self._year_listeners:
+            listener(self, year)
 
-        for entry in os.scandir(self._app_path):
-            if entry.is_dir() and entry.name.isdigit():
-                if self._get_year_expenses_file(entry.name).exists():
-                    available_years.append(int(entry.name))
+    def get_storage(self) -> Storage:
+        return self._storage
 
-        return sorted(available_years)
+    def get_available_expenses_files(self) -> list[int]:
+        return self._storage.get_expenses_years()
 
     def get_available_categories_files(self) -> list[int]:
-        if not os.path.exists(self._app_path):
-            return []
+        return self._storage.get_categories_years()
 
-        available_years = []
+    def has_year_expenses(self, year: str | int) -> bool:
+        return self._storage.has_year_expenses(int(year))
 
-        for entry in os.scandir(self._app_path):
-            if entry.is_dir() and entry.name.isdigit():
-                if self._get_year_categories_file(entry.name).exists():
-                    available_years.append(int(entry.name))
+    def has_year_categories(self, year: str | int) -> bool:
+        return self._storage.has_year_categories(int(year))
 
-        return sorted(available_years)
+    def get_year_expenses(self, year: str | int) -> YearExpensesReport:
+        return self._storage.get_year_expenses(int(year))
+
+    def store_year_expenses(self, year: str | int, expenses: list[ExpenseRecord]):
+        self._storage.store_year_expenses(int(year), expenses)
+        self._notify_year(int(year))
+
+    def list_expenses(
+        self,
+        year: str | int,
+        expense_filter: ExpenseFilter,
+        after: int = -1,
+        limit: int = 100,
+    ) -> list[tuple[int, ExpenseRecord]]:
+        return self._storage.list_expenses(int(year), expense_filter, after, limit)
+
+    def modify_expense(
+        self,
+        year: str | int,
+        row: int,
+        change: Callable[[ExpenseRecord], ExpenseRecord | None],
+    ) -> ExpenseRecord | None:
+        replacement = self._storage.modify_expense(int(year), row, change)
+        self._notify_year(int(year))
+
+        return replacement
+
+    def append_expenses(
+        self,
+        year: str | int,
+        report: YearExpensesReport,
+        expenses: ExpenseRecord | list[ExpenseRecord],
+    ) -> None:
+        if self._append_queue is None:
+            report.insert_expense(expenses)
+        else:
+            self._append_queue.append(report, expenses)
 
-    def _get_year_expenses_file(self, year: str | int) -> DbFile:
-        return DbFile(
-            os.path.join(
-                self._app_path,
-                str(year),
-                self.EXPENSES_FILE_NAME,
-            )
-        )
+        self._notify_year(int(year))
 
-    def get_year_expenses(self, year: str | int) -> YearExpensesReport:
-        return YearExpensesReport(self._get_year_expenses_file(year))
-
-    def _get_year_categories_file(self, year: str | int) -> DbFile:
-        return DbFile(
-            os.path.join(
-                self._app_path,
-                str(year),
-                self.CATEGORIES_FILE_NAME,
-            )
-        )
+    def get_year_summary(
+        self, year: str | int
+    ) -> YearExpensesSummary | YearExpensesReport:
+        return self._storage.get_year_summary(int(year))
 
     def get_year_categories(self, year: str | int) -> YearCategories:
-        return YearCategories(self._get_year_categories_file(year))
+        return self._storage.get_year_categories(int(year))
+
+    def store_year_categories(self, year: str | int, categories: list[CategoryRecord]):
+        self._storage.store_year_categories(int(year), categories)
+        self._notify_year(int(year))
+
+    def get_year_signatures(self, year: str | int) -> list[tuple[int, int, int] | None]:
+        return self._storage.get_year_signatures(int(year))
+
+    def get_savings_signatures(self) -> list[tuple[int, int, int] | None]:
+        return self._storage.get_savings_signatures()
 
     def get_savings(self) -> Savings:
-        db_file = DbFile(os.path.join(self._app_path, self.SAVINGS_FILE_NAME))
+        return self._storage.get_savings()
 
-        return Savings(db_file)
+    def update_savings(self):
+        """Yields the savings and stores them back, concurrent updates wait meanwhile."""
+        return self._storage.update_savings()
+
+    def add_to_savings(self, deltas: dict[str, float]) -> None:
+        """Adds the amounts to the balances of their savings categories."""
+        with self.update_savings() as savings:
+            for category, amount in deltas.items():
+                saving_record = savings.get_by_category().get(category, None)
+                if saving_record is not None:
+                    amount += saving_record.balance
+
+                savings.update(category, None, amount)
 
     def create_year_categories_file(
         self, year: str | int, template_year: str | int | None = None
@@ -126,13 +198,10 @@ class AppUser(User):
         except Exception as e:
             raise NameError(f"Year number looks odd : {e}")
 
-        categories_file = self._get_year_categories_file(escaped_year)
-
-        if template_year is None:
-            categories_file.create()
-        else:
-            template_file = self._get_year_categories_file(template_year)
-            categories_file.copy_from(template_file.get_path())
+        self._storage.create_year_categories(
+            escaped_year, None if template_year is None else int(template_year)
+        )
+        self._notify_year(escaped_year)
 
     def create_year_expenses(self, year: str | int, initial_balance: float) -> None:
         try:
@@ -142,36 +211,87 @@ class AppUser(User):
                 timestamp=datetime.now(),
                 category=CategoryType.INITIAL_BALANCE_LABEL.value,
                 expense_date=f"{escaped_year}-01-01",
-                amount=initial_balance,
+                amount=round_amount(initial_balance),
                 description=CategoryType.INITIAL_BALANCE_LABEL.value,
             )
         except Exception as e:
             raise NameError(f"Year number looks odd : {e}")
 
-        expenses_file = self._get_year_expenses_file(escaped_year)
-        expenses_file.create()
+        self._storage.create_year_expenses(escaped_year)
 
         year_expenses = self.get_year_expenses(escaped_year)
         year_expenses.insert_expense(initial_balance_entry)
+        self._notify_year(escaped_year)
 
 
 class Users:
+    """Users are materialized on first access and cached until their config changes.
+
+    Nothing is read at startup, a lookup costs one stat of the user's
+    config.toml, so accounts added or edited on disk show up without restarts.
+    """
+
     def __init__(self):
-        self._users_db = {}
+        self._db_path = None
+        self._lock = threading.Lock()
+        # username -> (config stat signature, user)
+        self._users_db: dict[str, tuple[tuple[int, int, int], AppUser]] = {}
+        self.expenses_cache = YearExpensesCache()
+        self.append_queue = GroupCommitQueue()
+        self.storage_backend = CsvStorage.NAME
+        self.year_listeners: list[Callable[[AppUser, int], None]] = []
+
+    def add_year_listener(self, listener: Callable[[AppUser, int], None]) -> None:
+        if listener not in self.year_listeners:
+            self.year_listeners.append(listener)
 
     def load(self, db_path: str) -> None:
         if not os.path.exists(db_path):
             raise FileNotFoundError(f"Database path {db_path} does not exist.")
 
-        with os.scandir(db_path) as entries:
-            for entry in entries:
-                user_directory = os.path.join(db_path, entry.name)
-                if not Config.config_file_exists(user_directory):
-                    continue
+        with self._lock:
+            self._db_path = db_path
+            self._users_db.clear()
+
+    @staticmethod
+    def _is_valid_username(username) -> bool:
+        # Usernames come from URLs and forms, they must name a direct subdirectory
+        return (
+            isinstance(username, str)
+            and username != ""
+            and not username.startswith(".")
+            and os.path.basename(username) == username
+        )
 
-                user = AppUser(id=entry.name, user_directory=user_directory)
+    def get(self, username) -> AppUser | None:
+        if self._db_path is None or not self._is_valid_username(username):
+            return None
+
+        user_directory = os.path.join(self._db_path, username)
+        config_file = DbFile(os.path.join(user_directory, Config.CONFIG_FILE_NAME))
+        signature = config_file.stat_signature()
+
+        if signature is None:
+            with self._lock:
+                self._users_db.pop(username, None)
+            return None
+
+        with self._lock:
+            cached = self._users_db.get(username, None)
+
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        user = AppUser(
+            id=username,
+            user_directory=user_directory,
+            expenses_cache=self.expenses_cache,
+            append_queue=self.append_queue,
+            storage_backend=self.storage_backend,
+            year_listeners=self.year_listeners,
+        )
 
-                self._users_db[user.id] = user
+        with self._lock:
+            self._users_db[username] = (signature, user)
 
-    def get(self, username) -> AppUser | None:
-        return self._users_db.get(username, None)
+        return user
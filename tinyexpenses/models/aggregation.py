@@ -0,0 +1,85 @@
+from .categories import CategoryType
+from .expenses import YearExpensesTotals
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def numpy_available() -> bool:
+    return numpy is not None
+
+
+class YearExpensesMatrix:
+    """A year as a (category x month) matrix, aggregated with vectorized masks.
+
+    Every sum is an ordered cumulative sum starting at 0.0, the same order the
+    plain Python loops in the views use, so the floats come out bit-identical.
+    """
+
+    def __init__(
+        self,
+        expenses_by_category_type: dict[CategoryType, dict[str, YearExpensesTotals]],
+    ):
+        if numpy is None:
+            raise ImportError("YearExpensesMatrix requires numpy.")
+
+        category_types = list(CategoryType)
+        rows = []
+        type_ids = []
+
+        for ct, categories in expenses_by_category_type.items():
+            for totals in categories.values():
+                rows.append(totals.totals)
+                type_ids.append(category_types.index(ct))
+
+        months = len(YearExpensesTotals().totals)
+
+        self._category_types = category_types
+        self._types = numpy.array(type_ids, dtype=numpy.int8)
+        self._totals = numpy.array(rows, dtype=numpy.float64).reshape(-1, months)
+
+        self._signs = numpy.where(
+            self._types == category_types.index(CategoryType.INCOME), 1.0, -1.0
+        )
+        self._signed = self._totals * self._signs[:, None]
+
+    @staticmethod
+    def _ordered_sum(values, axis: int):
+        # Leading zero keeps 0.0 + -0.0 == 0.0 semantics of the Python loops
+        padding = [(0, 0), (0, 0)]
+        padding[axis] = (1, 0)
+        padded = numpy.pad(values, padding)
+
+        return numpy.cumsum(padded, axis=axis).take(-1, axis=axis)
+
+    def stats(
+        self,
+    ) -> tuple[
+        dict[CategoryType, float],
+        YearExpensesTotals,
+        dict[CategoryType, YearExpensesTotals],
+    ]:
+        year_totals = {}
+        monthly_balance = YearExpensesTotals(
+            self._ordered_sum(self._signed, axis=0).tolist()
+        )
+        balance_per_type = {ct: YearExpensesTotals() for ct in CategoryType}
+        balance_per_type.pop(CategoryType.INITIAL_BALANCE_LABEL)
+
+        category_sums = self._ordered_sum(self._totals, axis=1) * self._signs
+
+        for type_id, ct in enumerate(self._category_types):
+            mask = self._types == type_id
+            if not mask.any():
+                continue
+
+            balance_per_type[ct] = YearExpensesTotals(
+                self._ordered_sum(self._signed[mask], axis=0).tolist()
+            )
+            year_totals[ct] = float(
+                self._ordered_sum(category_sums[mask][None, :], axis=1)[0]
+            )
+
+        return year_totals, monthly_balance, balance_per_type
@@ -1,5 +1,6 @@
 from enum import Enum
-from .file import DbFile, DbCSVReader, DbCSVWriter
+from types import MappingProxyType
+from .file import DbFile, DbCSVReader, DbCSVAtomicWriter
 from collections import defaultdict
 
 
@@ -63,6 +64,7 @@ class YearCategories:
         )
 
         self._load_categories()
+        self._build_lookups()
 
     def _load_categories(self) -> None:
         if not self._db_file.exists():
@@ -77,14 +79,40 @@ class YearCategories:
                         f"Cannot parse: {self._db_file.get_file_name()}:{row + 1} - {reason}."
                     )
 
-                self._by_category[category_record.category] = category_record
-                self._by_category_type[category_record.category_type][
-                    category_record.category
-                ] = category_record
+                self._index(category_record)
+
+    def _index(self, category_record: CategoryRecord) -> None:
+        self._by_category[category_record.category] = category_record
+        self._by_category_type[category_record.category_type][
+            category_record.category
+        ] = category_record
+
+    def _build_lookups(self) -> None:
+        # Immutable, callers may keep them while categories get inserted
+        self._type_by_category = MappingProxyType(
+            {
+                record.category: record.category_type
+                for record in self._by_category.values()
+            }
+        )
+
+        names_by_type = defaultdict(list)
+        for category, category_type in self._type_by_category.items():
+            names_by_type[category_type].append(category)
+
+        self._names_by_type = MappingProxyType(
+            {ct: frozenset(names_by_type[ct]) for ct in CategoryType}
+        )
 
     def get_categories(self) -> list[CategoryRecord]:
         return list(self._by_category.values())
 
+    def get_type_by_category(self) -> MappingProxyType:
+        return self._type_by_category
+
+    def get_names(self, category_type: CategoryType) -> frozenset[str]:
+        return self._names_by_type[category_type]
+
     def __getitem__(self, key: CategoryType | str):
         if isinstance(key, CategoryType):
             pass
@@ -104,23 +132,15 @@ class YearCategories:
         if record.category in self._by_category:
             return
 
-        self._by_category[record.category] = record
-        self._by_category_type[record.category_type][record.category] = record
+        self._index(record)
+        self._build_lookups()
+        self._store(list(self._by_category.values()))
 
-        YearCategories.store(self._db_file, list(self._by_category.values()))
+    def _store(self, categories: list[CategoryRecord]) -> None:
+        YearCategories.store(self._db_file, categories)
 
     @staticmethod
     def store(db_file: DbFile, categories: list[CategoryRecord]) -> None:
-        db_file.backup()
-        db_file.erase()
-
-        try:
-            with DbCSVWriter(
-                db_file, CategoryRecord.Columns.labels(), append_mode=True
-            ) as writer:
-                for category in categories:
-                    writer.write(category.serialize())
-
-        except Exception as e:
-            db_file.restore()
-            raise e
+        with DbCSVAtomicWriter(db_file, CategoryRecord.Columns.labels()) as writer:
+            for category in categories:
+                writer.write(category.serialize())
@@ -1,13 +1,18 @@
 import datetime
+import json
 import dateutil
 import calendar
+import threading
+from array import array
 from enum import Enum
 from dataclasses import dataclass, field
-from datetime import date, datetime
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable
 from .categories import CategoryType
 from collections import defaultdict
 
-from .file import DbFile, DbCSVReader, DbCSVWriter
+from .file import DbFile, DbCSVReader, DbCSVWriter, DbCSVAtomicWriter
+from .ledger import BinaryLedger, LedgerSnapshot
 
 
 @dataclass
@@ -65,7 +70,40 @@ class YearExpensesTotals:
         return iter(self.totals)
 
 
+def parse_timestamp(value: str) -> datetime:
+    # Rows written by the app are ISO formatted, dateutil is only needed for
+    # hand edited ones
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return dateutil.parser.parse(value)
+
+
+def parse_expense_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return dateutil.parser.parse(value).date()
+
+
+def parse_amount(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return float(value.replace(",", "."))
+
+
+def round_amount(value: str | float | int) -> float:
+    """Amount entered by a user, rounded to cents as the ledgers keep them."""
+    if isinstance(value, str):
+        value = parse_amount(value)
+
+    return round(float(value), 2)
+
+
 class ExpenseRecord:
+    __slots__ = ("timestamp", "category", "expense_date", "amount", "description")
+
     class Columns(Enum):
         TIMESTAMP = (0, "Timestamp")
         CATEGORY = (1, "Category")
@@ -92,14 +130,14 @@ class ExpenseRecord:
         if isinstance(timestamp, datetime):
             self.timestamp = timestamp
         elif isinstance(timestamp, str):
-            self.timestamp = dateutil.parser.parse(timestamp)
+            self.timestamp = parse_timestamp(timestamp)
         else:
             raise TypeError("Invalid type of timestamp.")
 
         if isinstance(expense_date, date):
             self.expense_date = expense_date
         elif isinstance(expense_date, str):
-            self.expense_date = dateutil.parser.parse(expense_date).date()
+            self.expense_date = parse_expense_date(expense_date)
         else:
             raise TypeError("Invalid type of date.")
 
@@ -108,7 +146,7 @@ class ExpenseRecord:
         if isinstance(amount, (float, int)):
             self.amount = float(amount)
         elif isinstance(amount, str):
-            self.amount = float(amount.replace(",", "."))
+            self.amount = parse_amount(amount)
         else:
             raise TypeError("Invalid type of amount.")
 
@@ -129,32 +167,324 @@ class ExpenseRecord:
         )
 
     def serialize(self) -> list[str]:
+        amount = f"{self.amount:.2f}"
+        # Input is rounded to cents, only amounts read from a hand edited file
+        # can have more decimals and those are written back as they are
+        if float(amount) != self.amount:
+            amount = repr(self.amount)
+
+        if self.timestamp.tzinfo is None:
+            timestamp = self.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            timestamp = self.timestamp.isoformat(sep=" ", timespec="seconds")
+
         row = [str()] * len(self.Columns)
-        row[self.Columns.AMOUNT.index] = f"{self.amount:.2f}"
+        row[self.Columns.AMOUNT.index] = amount
         row[self.Columns.CATEGORY.index] = self.category
-        row[self.Columns.TIMESTAMP.index] = self.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+        row[self.Columns.TIMESTAMP.index] = timestamp
         row[self.Columns.DESCRIPTION.index] = self.description
         row[self.Columns.EXPENSE_DATE.index] = self.expense_date.strftime("%Y-%m-%d")
 
         return row
 
 
+@dataclass(frozen=True)
+class ExpenseFilter:
+    date_from: date | None = None  # inclusive
+    date_to: date | None = None  # exclusive
+    category: str | None = None
+    amount_min: float | None = None
+    amount_max: float | None = None
+    # Case insensitive part of the description
+    text: str | None = None
+
+
+class YearExpensesColumns:
+    """Column store of a year, rows are materialized as ExpenseRecord on demand."""
+
+    _EPOCH = datetime(1, 1, 1)
+    _MICROSECOND = timedelta(microseconds=1)
+
+    def __init__(self):
+        self._timestamps = array("q")  # local microseconds since 0001-01-01
+        self._dates = array("i")  # proleptic Gregorian ordinals
+        self._amounts = array("d")
+        self._categories = array("I")  # indices into _category_names
+        # UTC offsets in seconds of the few timestamps that carry one, by row
+        self._utc_offsets: dict[int, int] = {}
+        self._descriptions: list[str] = []
+        self._descriptions_size = 0
+
+        self._category_names: list[str] = []
+        self._category_ids: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._dates)
+
+    def __getitem__(self, index: int) -> ExpenseRecord:
+        timestamp = self._EPOCH + self._timestamps[index] * self._MICROSECOND
+
+        utc_offset = self._utc_offsets.get(index, None)
+        if utc_offset is not None:
+            tzinfo = timezone(timedelta(seconds=utc_offset))
+            timestamp = timestamp.replace(tzinfo=tzinfo)
+
+        return ExpenseRecord(
+            timestamp=timestamp,
+            category=self._category_names[self._categories[index]],
+            expense_date=date.fromordinal(self._dates[index]),
+            amount=self._amounts[index],
+            description=self._descriptions[index],
+        )
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def select(
+        self, expense_filter: ExpenseFilter, after: int, limit: int
+    ) -> list[tuple[int, ExpenseRecord]]:
+        """Matching rows with indices above after, only those are materialized."""
+        category_id = None
+        if expense_filter.category is not None:
+            category_id = self._category_ids.get(expense_filter.category, None)
+            if category_id is None:
+                return []
+
+        date_from, date_to = (
+            None if value is None else value.toordinal()
+            for value in (expense_filter.date_from, expense_filter.date_to)
+        )
+        amount_min, amount_max = expense_filter.amount_min, expense_filter.amount_max
+        text = None if expense_filter.text is None else expense_filter.text.casefold()
+
+        dates, amounts, categories = self._dates, self._amounts, self._categories
+        rows = []
+
+        for index in range(max(after + 1, 0), len(dates)):
+            if date_from is not None and dates[index] < date_from:
+                continue
+            if date_to is not None and dates[index] >= date_to:
+                continue
+            if category_id is not None and categories[index] != category_id:
+                continue
+            if amount_min is not None and amounts[index] < amount_min:
+                continue
+            if amount_max is not None and amounts[index] > amount_max:
+                continue
+            if text is not None and text not in self._descriptions[index].casefold():
+                continue
+
+            rows.append((index, self[index]))
+            if len(rows) >= limit:
+                break
+
+        return rows
+
+    def append(self, expense: ExpenseRecord) -> None:
+        category_id = self._category_ids.get(expense.category, None)
+        if category_id is None:
+            category_id = len(self._category_names)
+            self._category_ids[expense.category] = category_id
+            self._category_names.append(expense.category)
+
+        utc_offset = expense.timestamp.utcoffset()
+        if utc_offset is not None:
+            self._utc_offsets[len(self._timestamps)] = int(utc_offset.total_seconds())
+
+        timestamp = expense.timestamp.replace(tzinfo=None)
+
+        self._timestamps.append((timestamp - self._EPOCH) // self._MICROSECOND)
+        self._dates.append(expense.expense_date.toordinal())
+        self._amounts.append(expense.amount)
+        self._categories.append(category_id)
+        self._descriptions.append(expense.description)
+        self._descriptions_size += len(expense.description)
+
+    def get_arrays(self) -> tuple[array, array, array, array]:
+        return self._timestamps, self._dates, self._amounts, self._categories
+
+    def get_descriptions(self) -> list[str]:
+        return self._descriptions
+
+    def get_category_names(self) -> list[str]:
+        return self._category_names
+
+    def get_utc_offsets(self) -> dict[int, int]:
+        return self._utc_offsets
+
+    @classmethod
+    def from_arrays(
+        cls,
+        timestamps: array,
+        dates: array,
+        amounts: array,
+        categories: array,
+        descriptions: list[str],
+        category_names: list[str],
+        utc_offsets: dict[int, int],
+    ) -> "YearExpensesColumns":
+        columns = cls()
+        columns._timestamps = timestamps
+        columns._dates = dates
+        columns._amounts = amounts
+        columns._categories = categories
+        columns._descriptions = descriptions
+        columns._descriptions_size = sum(map(len, descriptions))
+        columns._category_names = category_names
+        columns._category_ids = {name: i for i, name in enumerate(category_names)}
+        columns._utc_offsets = utc_offsets
+
+        return columns
+
+    def get_memory_footprint(self) -> int:
+        columns = (self._timestamps, self._dates, self._amounts, self._categories)
+        # A str object costs its characters plus ~50 bytes of header and a list slot
+        return (
+            sum(column.itemsize * len(column) for column in columns)
+            + self._descriptions_size
+            + 57 * len(self._descriptions)
+            + 100 * len(self._utc_offsets)
+        )
+
+
+class YearExpensesSummary:
+    """Per-category monthly totals of a year, persisted next to its CSV.
+
+    Answers balance and view requests without parsing the CSV, as long as the
+    CSV signature recorded in the sidecar still matches.
+    """
+
+    FILE_NAME_SUFFIX = ".summary.json"
+
+    def __init__(self, initial_balance: float, totals: dict[str, YearExpensesTotals]):
+        self.initial_balance = initial_balance
+        self._category_monthly_totals = totals
+
+    @classmethod
+    def get_file(cls, db_file: DbFile) -> DbFile:
+        return DbFile(db_file.get_path() + cls.FILE_NAME_SUFFIX)
+
+    @classmethod
+    def load(cls, db_file: DbFile) -> "YearExpensesSummary | None":
+        # Totals signed before an interrupted append must not hide its rows
+        db_file.recover_journal()
+
+        signature = db_file.stat_signature()
+        if signature is None:
+            return None
+
+        try:
+            with open(cls.get_file(db_file).get_path(), "rb") as file:
+                data = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if data.get("signature") != list(signature):
+            return None
+
+        return cls(
+            data["initial_balance"],
+            {
+                category: YearExpensesTotals(totals)
+                for category, totals in data["totals"].items()
+            },
+        )
+
+    @classmethod
+    def store(
+        cls,
+        db_file: DbFile,
+        signature: tuple[int, int, int],
+        initial_balance: float,
+        totals: dict[str, YearExpensesTotals],
+    ) -> None:
+        data = {
+            "signature": list(signature),
+            "initial_balance": initial_balance,
+            "totals": {category: total.totals for category, total in totals.items()},
+        }
+
+        cls.get_file(db_file).replace_content(json.dumps(data).encode())
+
+    def get_expenses_by_category_monthly_totals(self) -> dict[str, YearExpensesTotals]:
+        return {
+            category: YearExpensesTotals(list(totals.totals))
+            for category, totals in self._category_monthly_totals.items()
+        }
+
+
 class YearExpensesReport:
     def __init__(self, db_file: DbFile):
         self._db_file: DbFile = db_file
-        self._by_category: dict[str, list[ExpenseRecord]] = defaultdict(list)
+        self._lock = threading.RLock()
+
+        self._reset()
+        self._load_expenses()
+
+    def _reset(self) -> None:
+        self._columns = YearExpensesColumns()
         self._category_monthly_totals: dict[str, YearExpensesTotals] = defaultdict(
             YearExpensesTotals
         )
+        self._signature: tuple[int, int, int] | None = None
+        # Signatures around this report's last append, see refresh()
+        self._own_append = None
+        self._offset: int = 0
+        self._rows_read: int = 0
         self.initial_balance: float = 0.0
 
-        self._load_expenses()
+    def _load_ledger(self) -> None:
+        snapshot = BinaryLedger.load(self._db_file)
+
+        # Any change since it was written, even one keeping size and inode,
+        # may have rewritten rows in place, the CSV is parsed again then
+        if snapshot is None or snapshot.signature != self._db_file.stat_signature():
+            return
+
+        self._columns = YearExpensesColumns.from_arrays(
+            snapshot.timestamps,
+            snapshot.dates,
+            snapshot.amounts,
+            snapshot.categories,
+            snapshot.descriptions,
+            snapshot.category_names,
+            snapshot.utc_offsets,
+        )
+        self._category_monthly_totals = defaultdict(
+            YearExpensesTotals,
+            {
+                category: YearExpensesTotals(totals)
+                for category, totals in snapshot.totals.items()
+            },
+        )
+        self.initial_balance = snapshot.initial_balance
+        self._signature = snapshot.signature
+        self._offset = snapshot.offset
+        self._rows_read = snapshot.rows_read
 
     def _load_expenses(self) -> None:
-        if not self._db_file.exists():
+        cold = self._offset == 0
+
+        if cold:
+            # Finish an append interrupted by a crash before reading the file
+            self._db_file.recover_journal()
+            self._load_ledger()
+
+        ledger_offset = self._offset
+
+        # Stat before reading, a write racing with the read makes it stale
+        self._signature = self._db_file.stat_signature()
+
+        if self._signature is None:
             raise FileNotFoundError(f"File {self._db_file.get_path()} does not exist.")
 
-        with DbCSVReader(self._db_file, ExpenseRecord.Columns.labels()) as reader:
+        with DbCSVReader(
+            self._db_file,
+            ExpenseRecord.Columns.labels(),
+            offset=self._offset,
+            row=self._rows_read,
+        ) as reader:
             for row, line in reader.read():
                 try:
                     expense = ExpenseRecord(*line)
@@ -163,57 +493,167 @@ class YearExpensesReport:
                         f"Cannot parse: {self._db_file.get_file_name()}:{row + 1} - {reason}."
                     )
 
-                if expense.category == CategoryType.INITIAL_BALANCE_LABEL.value:
-                    self.initial_balance = expense.amount
+                self._fold_expense(expense)
+
+            self._offset = reader.offset
+            self._rows_read = reader.row
+
+        if cold and self._offset != ledger_offset:
+            self.store_ledger()
+
+    def _fold_expense(self, expense: ExpenseRecord) -> None:
+        if expense.category == CategoryType.INITIAL_BALANCE_LABEL.value:
+            self.initial_balance = expense.amount
+
+        self._columns.append(expense)
+        self._category_monthly_totals[expense.category].totals[
+            expense.expense_date.month - 1
+        ] += expense.amount
+
+    def refresh(self) -> None:
+        with self._lock:
+            signature = self._db_file.stat_signature()
+            if signature == self._signature:
+                return
+
+            # Only an append this report made on top of what it had read may be
+            # read as a tail, any other change could have rewritten rows in place
+            own_append, self._own_append = self._own_append, None
+            if own_append != (self._signature, signature):
+                self._reset()
+
+            try:
+                self._load_expenses()
+            except Exception:
+                # Never serve a half-read year as fresh
+                self._reset()
+                raise
+
+    def store_summary(self) -> None:
+        with self._lock:
+            # Only a snapshot that ends exactly at the stat'ed size describes it
+            if self._signature is None or self._signature[1] != self._offset:
+                return
+
+            YearExpensesSummary.store(
+                self._db_file,
+                self._signature,
+                self.initial_balance,
+                self._category_monthly_totals,
+            )
+
+    def store_ledger(self) -> None:
+        with self._lock:
+            if self._signature is None or self._signature[1] != self._offset:
+                return
+
+            BinaryLedger.store(
+                self._db_file,
+                LedgerSnapshot(
+                    self._signature,
+                    self._offset,
+                    self._rows_read,
+                    *self._columns.get_arrays(),
+                    self._columns.get_descriptions(),
+                    self._columns.get_category_names(),
+                    self._columns.get_utc_offsets(),
+                    self.initial_balance,
+                    {
+                        category: totals.totals
+                        for category, totals in self._category_monthly_totals.items()
+                    },
+                ),
+            )
+
+    def get_path(self) -> str:
+        return self._db_file.get_path()
 
-                self._by_category[expense.category].append(expense)
-                self._category_monthly_totals[expense.category].totals[
-                    expense.expense_date.month - 1
-                ] += expense.amount
+    def get_memory_footprint(self) -> int:
+        return self._columns.get_memory_footprint()
 
     def get_expenses_by_category_monthly_totals(self) -> dict[str, YearExpensesTotals]:
-        return self._category_monthly_totals
+        with self._lock:
+            return {
+                category: YearExpensesTotals(list(totals.totals))
+                for category, totals in self._category_monthly_totals.items()
+            }
 
     def get_expenses(self) -> list[ExpenseRecord]:
-        return sum(self._by_category.values(), [])
+        with self._lock:
+            return list(self._columns)
+
+    def list_expenses(
+        self, expense_filter: ExpenseFilter, after: int = -1, limit: int = 100
+    ) -> list[tuple[int, ExpenseRecord]]:
+        with self._lock:
+            return self._columns.select(expense_filter, after, limit)
+
+    def modify_expense(
+        self,
+        row: int,
+        change: Callable[[ExpenseRecord], ExpenseRecord | None],
+    ) -> ExpenseRecord | None:
+        # A CSV cannot change a row in place, the file is rewritten atomically
+        with self._lock, self._db_file.write_lock():
+            self.refresh()
+
+            if not 0 <= row < len(self._columns):
+                raise KeyError(row)
+
+            expenses = list(self._columns)
+            replacement = change(expenses[row])
+
+            if replacement is None:
+                del expenses[row]
+            else:
+                expenses[row] = replacement
+
+            YearExpensesReport.store(self._db_file, expenses)
+            self.refresh()
+
+        return replacement
 
     def insert_expense(self, expenses: ExpenseRecord | list[ExpenseRecord]) -> None:
         if not isinstance(expenses, list):
             expenses = [expenses]
 
-        self._db_file.backup()
-
-        try:
+        with self._lock:
             with DbCSVWriter(
-                self._db_file, ExpenseRecord.Columns.labels(), append_mode=True
+                self._db_file,
+                ExpenseRecord.Columns.labels(),
+                append_mode=True,
+                journaled=True,
             ) as writer:
                 for expense in expenses:
-                    self._by_category[expense.category].append(expense)
-                    self._category_monthly_totals[expense.category][
-                        expense.expense_date.month - 1
-                    ] += expense.amount
-
                     writer.write(expense.serialize())
 
-        except Exception as e:
-            self._db_file.restore()
-            raise e
+            # Read back only the appended tail
+            self._own_append = writer.appended
+            self.refresh()
+            self.store_summary()
+            # Any append invalidates the ledger, keep the next cold load on it
+            self.store_ledger()
 
     @staticmethod
     def store(db_file: DbFile, expenses: list[ExpenseRecord]) -> None:
         if not db_file.exists():
             raise FileNotFoundError("Expenses file does not exists.")
 
-        db_file.backup()
-        db_file.erase()
+        initial_balance = 0.0
+        totals: dict[str, YearExpensesTotals] = defaultdict(YearExpensesTotals)
 
-        try:
-            with DbCSVWriter(
-                db_file, ExpenseRecord.Columns.labels(), append_mode=True
-            ) as writer:
+        for expense in expenses:
+            if expense.category == CategoryType.INITIAL_BALANCE_LABEL.value:
+                initial_balance = expense.amount
+
+            totals[expense.category][expense.expense_date.month - 1] += expense.amount
+
+        # Appends wait until the sidecar is signed with the file just written
+        with db_file.write_lock():
+            with DbCSVAtomicWriter(db_file, ExpenseRecord.Columns.labels()) as writer:
                 for expense in expenses:
                     writer.write(expense.serialize())
 
-        except Exception as e:
-            db_file.restore()
-            raise e
+            YearExpensesSummary.store(
+                db_file, db_file.stat_signature(), initial_balance, totals
+            )
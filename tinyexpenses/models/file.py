@@ -1,37 +1,335 @@
+import io
 import os
 import csv
-from contextlib import AbstractContextManager
+import errno
+import shutil
+import zlib
+import struct
+import locale
+import tempfile
+import threading
+from contextlib import AbstractContextManager, contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Linux ioctl sharing the extents of one file with another (btrfs, xfs, ...)
+_FICLONE = 0x40049409
+_COPY_CHUNK_SIZE = 1024 * 1024
+# Errors meaning "this primitive is not usable here", not a real I/O failure
+_COPY_UNSUPPORTED = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.EBADF,
+}
+
+
+class _FileLock:
+    """Reader/writer lock of one file, shared by threads and optionally processes.
+
+    Threads are coordinated in process. With across_processes the process as
+    a whole also holds a shared or exclusive flock on `<file>.lock` while it
+    has readers or a writer, taken outside the in-process condition so a
+    foreign holder only stalls the threads that need the file. Queued writers
+    stop new readers from entering, so a steady stream of reads cannot starve
+    a write. Both sides are reentrant and a writer may also read, but a
+    reader cannot upgrade to a writer.
+    """
+
+    LOCK_FILE_NAME_SUFFIX = ".lock"
+
+    def __init__(self, path: str, across_processes: bool):
+        self._lock_path = path + self.LOCK_FILE_NAME_SUFFIX
+        self._across_processes = across_processes and fcntl is not None
+        # Open only while the flock is held, closing it releases the flock
+        self._lock_fd = None
+        self._cond = threading.Condition()
+        self._readers: dict[int, int] = {}
+        # The first reader is still waiting for the shared flock
+        self._sharing = False
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+
+    def _os_lock(self, exclusive: bool) -> None:
+        if not self._across_processes:
+            return
+
+        fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        except BaseException:
+            os.close(fd)
+            raise
+
+        self._lock_fd = fd
+
+    def _os_unlock(self) -> None:
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def _forget_os_lock(self) -> None:
+        # A forked child must not release its parent's flock, so no LOCK_UN
+        self._os_unlock()
+
+    def acquire_read(self) -> None:
+        me = threading.get_ident()
+
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+
+            if me in self._readers:
+                self._readers[me] += 1
+                return
+
+            while self._writer is not None or self._waiting_writers or self._sharing:
+                self._cond.wait()
+
+            self._readers[me] = 1
+            if len(self._readers) > 1:
+                return
+
+            self._sharing = True
+
+        try:
+            self._os_lock(exclusive=False)
+        except BaseException:
+            with self._cond:
+                del self._readers[me]
+                self._sharing = False
+                self._cond.notify_all()
+            raise
+
+        with self._cond:
+            self._sharing = False
+            self._cond.notify_all()
+
+    def release_read(self) -> None:
+        me = threading.get_ident()
+
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth -= 1
+                return
+
+            self._readers[me] -= 1
+            if self._readers[me] == 0:
+                del self._readers[me]
+
+            if not self._readers:
+                self._os_unlock()
+                self._cond.notify_all()
+
+    def acquire_write(self) -> None:
+        me = threading.get_ident()
+
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+
+            if me in self._readers:
+                raise RuntimeError(
+                    f"Cannot upgrade a read lock of {self._lock_path} to a write lock."
+                )
+
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+
+            self._writer = me
+            self._writer_depth = 1
+
+        try:
+            self._os_lock(exclusive=True)
+        except BaseException:
+            with self._cond:
+                self._writer = None
+                self._writer_depth = 0
+                self._cond.notify_all()
+            raise
+
+    def release_write(self) -> None:
+        with self._cond:
+            self._writer_depth -= 1
+            if self._writer_depth > 0:
+                return
+
+            self._writer = None
+            self._os_unlock()
+            self._cond.notify_all()
+
+
+_file_locks: dict[str, _FileLock] = {}
+_file_locks_lock = threading.Lock()
+
+
+def _get_file_lock(path: str, across_processes: bool) -> _FileLock:
+    path = os.path.abspath(path)
+
+    with _file_locks_lock:
+        lock = _file_locks.get(path)
+        if lock is None:
+            lock = _file_locks[path] = _FileLock(path, across_processes)
+
+        return lock
+
+
+def _reset_file_locks_in_child() -> None:
+    # Locks held by the parent's threads are not ours, start from scratch
+    global _file_locks_lock
+
+    for lock in _file_locks.values():
+        lock._forget_os_lock()
+
+    _file_locks.clear()
+    _file_locks_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_file_locks_in_child)
+
+
+def _copy_file(src, dst) -> None:
+    """Copies src into dst (binary file objects) without passing through Python memory.
+
+    Tries a reflink, then copy_file_range, then sendfile, and finally falls
+    back to fixed size chunks.
+    """
+    src_fd, dst_fd = src.fileno(), dst.fileno()
+
+    if fcntl is not None:
+        try:
+            fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+            return
+        except OSError:
+            pass
+
+    size = os.fstat(src_fd).st_size
+    copied = 0
+
+    for primitive in ("copy_file_range", "sendfile"):
+        if not hasattr(os, primitive):
+            continue
+
+        try:
+            while copied < size:
+                if primitive == "copy_file_range":
+                    sent = os.copy_file_range(
+                        src_fd, dst_fd, size - copied, copied, copied
+                    )
+                else:
+                    os.lseek(dst_fd, copied, os.SEEK_SET)
+                    sent = os.sendfile(dst_fd, src_fd, copied, size - copied)
+
+                if sent == 0:
+                    break
+
+                copied += sent
+
+            return
+        except OSError as e:
+            if e.errno not in _COPY_UNSUPPORTED:
+                raise
+
+    src.seek(copied)
+    dst.seek(copied)
+    shutil.copyfileobj(src, dst, _COPY_CHUNK_SIZE)
+
+
+@contextmanager
+def _atomic_replace(path: str):
+    """Yields a binary temp file that replaces path once the block succeeds."""
+    directory, name = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.")
+
+    try:
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+        os.fchmod(fd, mode)
+
+        with open(fd, "wb") as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
 
 
 class DbFile:
     BACKUP_FILE_NAME_SUFFIX = ".bak"
+    JOURNAL_FILE_NAME_SUFFIX = ".wal"
+    # magic, offset the append starts at, payload length, payload crc32, and
+    # the inode and mtime of the file the append was meant for
+    JOURNAL_HEADER = struct.Struct("<4sQQIQq")
+    JOURNAL_MAGIC = b"TXJ2"
 
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, lock_across_processes: bool = False):
         self._dir = os.path.dirname(file_path)
+        # Only files other processes append to or rewrite need a `.lock` file
+        self._lock_across_processes = lock_across_processes
 
         self._file_name = os.path.basename(file_path)
         self._file_path = os.path.join(self._dir, self._file_name)
         self._backup_file_path = os.path.join(
             self._dir, self._file_name + self.BACKUP_FILE_NAME_SUFFIX
         )
+        self._journal_file_path = os.path.join(
+            self._dir, self._file_name + self.JOURNAL_FILE_NAME_SUFFIX
+        )
 
     def exists(self) -> bool:
         return os.path.exists(self._file_path)
 
+    @contextmanager
+    def read_lock(self):
+        lock = _get_file_lock(self._file_path, self._lock_across_processes)
+        lock.acquire_read()
+        try:
+            yield
+        finally:
+            lock.release_read()
+
+    @contextmanager
+    def write_lock(self):
+        lock = _get_file_lock(self._file_path, self._lock_across_processes)
+        lock.acquire_write()
+        try:
+            yield
+        finally:
+            lock.release_write()
+
     def create(self):
         if self.exists():
             raise FileExistsError(f"File {self._file_path} already exists.")
 
         os.makedirs(os.path.dirname(self._file_path), exist_ok=True)
 
-        with open(self._file_path, mode="w", newline="") as _:
+        with self.write_lock(), open(self._file_path, mode="x", newline="") as _:
             pass
 
     def erase(self):
         if not os.path.exists(self._file_path):
             raise FileNotFoundError(f"Provided path does not exist {self._file_path}.")
 
-        with open(self._file_path, mode="r+", newline="") as file:
+        with self.write_lock(), open(self._file_path, mode="r+", newline="") as file:
             file.truncate(0)
 
     def backup(self):
@@ -43,31 +341,187 @@ class DbFile:
                 f"Backup file for {self._file_path} does not exist."
             )
 
-        try:
-            self.erase()
-        except FileNotFoundError:
-            pass
-
         self.copy_from(self._backup_file_path)
 
     def copy_from(self, src_file):
         if not os.path.exists(src_file):
             raise FileNotFoundError(f"Provided path does not exist {src_file}.")
 
-        with (
-            open(src_file, "rb") as src,
-            open(self._file_path, "wb") as dst,
-        ):
-            dst.write(src.read())
+        with self.write_lock():
+            # The new content supersedes an interrupted append, see _recover_journal
+            self.recover_journal()
+
+            with open(src_file, "rb") as src, _atomic_replace(self._file_path) as dst:
+                _copy_file(src, dst)
 
     def copy_to(self, dst_file):
         if not os.path.exists(self._file_path):
             raise FileNotFoundError(f"Provided path does not exist {self._file_path}.")
-        with (
-            open(self._file_path, "rb") as src,
-            open(dst_file, "wb") as dst,
-        ):
-            dst.write(src.read())
+
+        with self.read_lock():
+            with open(self._file_path, "rb") as src, _atomic_replace(dst_file) as dst:
+                _copy_file(src, dst)
+
+    def journaled_append(
+        self, payload: bytes
+    ) -> tuple[tuple[int, int, int] | None, tuple[int, int, int] | None]:
+        """Appends payload so that a crash leaves either none or all of it.
+
+        The intent (start offset and payload) is made durable in a small
+        journal first, so the cost does not grow with the file size. Returns
+        the stat signatures of the file right before and after the append.
+        """
+        with self.write_lock():
+            self.recover_journal()
+
+            before = self.stat_signature()
+            if before is None:
+                raise FileNotFoundError(
+                    f"Provided path does not exist {self._file_path}."
+                )
+
+            mtime_ns, offset, inode = before
+            header = self.JOURNAL_HEADER.pack(
+                self.JOURNAL_MAGIC,
+                offset,
+                len(payload),
+                zlib.crc32(payload),
+                inode,
+                mtime_ns,
+            )
+
+            with open(self._journal_file_path, "wb") as journal:
+                journal.write(header + payload)
+                journal.flush()
+                os.fsync(journal.fileno())
+
+            self._write_at(offset, payload)
+
+            os.unlink(self._journal_file_path)
+
+            return before, self.stat_signature()
+
+    def recover_journal(self) -> None:
+        # Cheap check first, readers call this on every full load
+        if not os.path.exists(self._journal_file_path):
+            return
+
+        with self.write_lock():
+            self._recover_journal()
+
+    def _recover_journal(self) -> None:
+        try:
+            with open(self._journal_file_path, "rb") as journal:
+                record = journal.read()
+        except FileNotFoundError:
+            return
+
+        header_size = self.JOURNAL_HEADER.size
+        payload = record[header_size:]
+
+        try:
+            magic, offset, length, crc, inode, mtime_ns = self.JOURNAL_HEADER.unpack(
+                record[:header_size]
+            )
+        except struct.error:
+            magic = None
+
+        # A torn journal means the append itself never started
+        complete = (
+            magic == self.JOURNAL_MAGIC
+            and length == len(payload)
+            and crc == zlib.crc32(payload)
+        )
+
+        if complete and self._is_journal_target(offset, payload, inode, mtime_ns):
+            # Roll forward over whatever part of the append made it to disk
+            self._write_at(offset, payload)
+
+        os.unlink(self._journal_file_path)
+
+    def _is_journal_target(
+        self, offset: int, payload: bytes, inode: int, mtime_ns: int
+    ) -> bool:
+        """Whether the file is still the one the journaled append was made to.
+
+        That is the file as it was before the append, or it followed by a
+        prefix of the payload. A file rewritten or edited since then would
+        have its newer rows overwritten by the stale journal otherwise.
+        """
+        try:
+            stat = os.stat(self._file_path)
+        except FileNotFoundError:
+            return False
+
+        if stat.st_ino != inode or not offset <= stat.st_size <= offset + len(payload):
+            return False
+
+        if stat.st_size == offset:
+            return stat.st_mtime_ns == mtime_ns
+
+        landed = self.read_bytes(offset, stat.st_size - offset)
+        return payload.startswith(landed)
+
+    def _write_at(self, offset: int, payload: bytes) -> None:
+        with open(self._file_path, "r+b") as file:
+            file.truncate(offset)
+            file.seek(offset)
+            file.write(payload)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def stat_signature(self) -> tuple[int, int, int] | None:
+        try:
+            stat = os.stat(self._file_path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def read_bytes(self, offset: int, size: int) -> bytes:
+        with open(self._file_path, "rb") as file:
+            file.seek(offset)
+            return file.read(size)
+
+    @contextmanager
+    def atomic_replace(self, keep_backup: bool = True):
+        """Yields a binary file whose content replaces this file on success.
+
+        The previous version is kept as the backup through a hard link, so
+        nothing is copied.
+        """
+        with self.write_lock():
+            # The new content supersedes an interrupted append, see _recover_journal
+            self.recover_journal()
+
+            if keep_backup:
+                self._link_backup()
+
+            with _atomic_replace(self._file_path) as file:
+                yield file
+
+    def _link_backup(self) -> None:
+        temp_path = self._backup_file_path + ".tmp"
+
+        try:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+            os.link(self._file_path, temp_path)
+            os.replace(temp_path, self._backup_file_path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            # Filesystem without hard links
+            self.backup()
+
+    def replace_content(self, data: bytes) -> None:
+        # Readers see either the old or the new file, never a partial one
+        with self.write_lock():
+            self.recover_journal()
+
+            with _atomic_replace(self._file_path) as file:
+                file.write(data)
 
     def get_path(self) -> str:
         return os.path.join(self._dir, self._file_name)
@@ -77,20 +531,48 @@ class DbFile:
 
 
 class DbCSVReader(AbstractContextManager):
-    def __init__(self, db_file: DbFile, columns: list):
+    def __init__(self, db_file: DbFile, columns: list, offset: int = 0, row: int = 0):
         self._db_file = db_file
         self._columns = columns
+        # Byte offset just past the last complete record yielded so far
+        self.offset = offset
+        # Index of the next record, keeps error messages absolute on tail reads
+        self.row = row
 
     def __enter__(self):
-        self._file = open(self._db_file.get_path(), mode="r", newline="")
-        self._reader = csv.reader(self._file)
+        # Opened before locking, a missing file must not leave a lock file behind
+        self._file = open(self._db_file.get_path(), mode="rb")
+        self._read_lock = self._db_file.read_lock()
+
+        try:
+            self._read_lock.__enter__()
+        except BaseException:
+            self._file.close()
+            raise
+
+        self._file.seek(self.offset)
+        self._consumed = self.offset
+        self._reader = csv.reader(self._decoded_lines())
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
         self._file.close()
+        self._read_lock.__exit__(exc_type, exc_value, traceback)
+
+    def _decoded_lines(self):
+        encoding = locale.getpreferredencoding(False)
+
+        for raw in self._file:
+            self._consumed += len(raw)
+            yield raw.decode(encoding)
 
     def read(self):
-        for row, line in enumerate(self._reader):
+        for line in self._reader:
+            row = self.row
+            self.row += 1
+            # csv pulls exactly the lines of one record, so this is a record boundary
+            self.offset = self._consumed
+
             if len(line) == 0:
                 continue
 
@@ -103,9 +585,14 @@ class DbCSVReader(AbstractContextManager):
 
 
 class DbCSVWriter(AbstractContextManager):
-    def __init__(self, db_file: DbFile, columns: list, append_mode=True):
+    def __init__(
+        self, db_file: DbFile, columns: list, append_mode=True, journaled=False
+    ):
         self._db_file = db_file
         self._columns = columns
+        self._journaled = journaled and append_mode
+        # Signatures around the journaled append, None until it happened
+        self.appended = None
 
         if append_mode:
             self._mode = "a"
@@ -113,23 +600,60 @@ class DbCSVWriter(AbstractContextManager):
             self._mode = "w"
 
     def __enter__(self):
-        self.ensure_trailing_newline()
-        self._file = open(self._db_file.get_path(), mode=self._mode, newline="")
+        if self._journaled:
+            # Rows are collected and appended at once through the journal
+            self._file = io.StringIO(newline="")
+            self._writer = csv.writer(self._file)
+            return self
+
+        self._write_lock = self._db_file.write_lock()
+        self._write_lock.__enter__()
+
+        try:
+            self.ensure_trailing_newline()
+            self._file = open(self._db_file.get_path(), mode=self._mode, newline="")
+        except BaseException:
+            self._write_lock.__exit__(None, None, None)
+            raise
+
         self._writer = csv.writer(self._file)
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self._file.close()
+        if not self._journaled:
+            try:
+                self._file.close()
+            finally:
+                self._write_lock.__exit__(exc_type, exc_value, traceback)
+            return
 
-    def ensure_trailing_newline(self):
-        with open(self._db_file.get_path(), "rb+") as f:
+        if exc_type is not None or self._file.tell() == 0:
+            return
+
+        payload = self._file.getvalue().encode(locale.getpreferredencoding(False))
+
+        # The newline check and the append must see the same file
+        with self._db_file.write_lock():
+            if not self._ends_with_newline():
+                payload = b"\n" + payload
+
+            self.appended = self._db_file.journaled_append(payload)
+
+    def _ends_with_newline(self) -> bool:
+        with open(self._db_file.get_path(), "rb") as f:
             f.seek(0, os.SEEK_END)
             if f.tell() == 0:
-                return
+                return True
 
             f.seek(-1, os.SEEK_END)
-            if f.read(1) != b"\n":
-                f.write(b"\n")
+            return f.read(1) == b"\n"
+
+    def ensure_trailing_newline(self):
+        if self._ends_with_newline():
+            return
+
+        with open(self._db_file.get_path(), "ab") as f:
+            f.write(b"\n")
 
     def write(self, row: list):
         if len(row) != len(self._columns):
@@ -137,3 +661,27 @@ class DbCSVWriter(AbstractContextManager):
                 f"Cannot write: {self._db_file.get_file_name()} - Got {len(row)} columns, expected {len(self._columns)}."
             )
         self._writer.writerow(row)
+
+
+class DbCSVAtomicWriter(DbCSVWriter):
+    """Rewrites the whole file; readers see the old or the new rows, never a mix."""
+
+    def __init__(self, db_file: DbFile, columns: list):
+        super().__init__(db_file, columns, append_mode=False)
+
+    def __enter__(self):
+        self._replace = self._db_file.atomic_replace()
+        binary = self._replace.__enter__()
+
+        self._file = io.TextIOWrapper(
+            binary, encoding=locale.getpreferredencoding(False), newline=""
+        )
+        self._writer = csv.writer(self._file)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Hand the still open binary file back, atomic_replace syncs and closes it
+        self._file.flush()
+        self._file.detach()
+
+        return self._replace.__exit__(exc_type, exc_value, traceback)
@@ -0,0 +1,104 @@
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+from .expenses import ExpenseRecord, YearExpensesReport
+
+
+class GroupCommitQueue:
+    """Merges appends to the same file that arrive close together into one write.
+
+    Each file gets a writer thread while it is busy. The thread waits at most
+    max_latency after the first queued append for others to join, writes the
+    whole group with a single journaled append (one write, one fsync) and then
+    wakes every caller with the shared outcome.
+    """
+
+    DEFAULT_MAX_BATCH = 256
+    DEFAULT_MAX_LATENCY = 0.002
+    # A writer thread without work for this long goes away
+    IDLE_TIMEOUT = 30.0
+
+    def __init__(
+        self, max_batch: int = DEFAULT_MAX_BATCH, max_latency: float = DEFAULT_MAX_LATENCY
+    ):
+        self._lock = threading.Lock()
+        self._queues: dict[str, Queue] = {}
+        self.configure(max_batch, max_latency)
+
+    def configure(self, max_batch: int, max_latency: float) -> None:
+        self._max_batch = max(1, max_batch)
+        self._max_latency = max(0.0, max_latency)
+
+    def append(
+        self, report: YearExpensesReport, expenses: ExpenseRecord | list[ExpenseRecord]
+    ) -> None:
+        """Blocks until the expenses are durable, raises what the group write raised."""
+        if not isinstance(expenses, list):
+            expenses = [expenses]
+
+        future = Future()
+        path = report.get_path()
+
+        # Registering under the lock closes the race with an idle thread leaving
+        with self._lock:
+            queue = self._queues.get(path, None)
+
+            if queue is None:
+                queue = self._queues[path] = Queue()
+                threading.Thread(
+                    target=self._run,
+                    args=(path, queue),
+                    name="expenses-append",
+                    daemon=True,
+                ).start()
+
+            queue.put((report, expenses, future))
+
+        future.result()
+
+    def _run(self, path: str, queue: Queue) -> None:
+        while True:
+            try:
+                first = queue.get(timeout=self.IDLE_TIMEOUT)
+            except Empty:
+                with self._lock:
+                    if queue.empty():
+                        self._queues.pop(path, None)
+                        return
+                continue
+
+            group = [first]
+            rows = len(first[1])
+            deadline = time.monotonic() + self._max_latency
+
+            while rows < self._max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+
+                try:
+                    item = queue.get(timeout=timeout)
+                except Empty:
+                    break
+
+                group.append(item)
+                rows += len(item[1])
+
+            self._commit(group)
+
+    @staticmethod
+    def _commit(group: list[tuple[YearExpensesReport, list[ExpenseRecord], Future]]):
+        # Every report in a group reads the same file, the latest one is freshest
+        report = group[-1][0]
+        expenses = [expense for _, items, _ in group for expense in items]
+
+        try:
+            report.insert_expense(expenses)
+        except Exception as e:
+            for _, _, future in group:
+                future.set_exception(e)
+            return
+
+        for _, _, future in group:
+            future.set_result(None)
@@ -0,0 +1,218 @@
+import sys
+import json
+import mmap
+import struct
+from array import array
+from dataclasses import dataclass
+from itertools import accumulate
+from .file import DbFile
+
+
+@dataclass
+class LedgerSnapshot:
+    # State of the CSV the ledger was built from
+    signature: tuple[int, int, int]
+    offset: int
+    rows_read: int
+
+    timestamps: array
+    dates: array
+    amounts: array
+    categories: array
+    descriptions: list[str]
+    category_names: list[str]
+    # Row index -> UTC offset in seconds, only for timestamps that have one
+    utc_offsets: dict[int, int]
+
+    initial_balance: float
+    totals: dict[str, list[float]]
+
+
+class BinaryLedger:
+    """Columnar binary copy of a year CSV, loaded through mmap without parsing rows.
+
+    Layout, little endian and packed, the header being 88 bytes and the
+    columns ordered by item size so each starts at a multiple of its own:
+        header
+        timestamps  q * rows    local microseconds since 0001-01-01
+        amounts     d * rows
+        dates       i * rows    proleptic Gregorian ordinals
+        categories  I * rows    indices into the category names
+        q * (rows + 1)          character offsets into the descriptions
+        q * (categories + 1)    character offsets into the category names
+        descriptions, category names    UTF-8
+        UTC offsets and totals as JSON
+
+    The CSV stays the source of truth, the ledger is used only while the CSV
+    still has the stat signature recorded in the header. It is written again
+    after every append a report makes and on the full parse that follows any
+    other change, so it stays current for years that keep receiving writes.
+    """
+
+    FILE_NAME_SUFFIX = ".ledger"
+    MAGIC = b"TXB1"
+    VERSION = 3
+    # magic, version, csv mtime_ns, size and inode, csv offset and rows read,
+    # rows, categories, then byte lengths of descriptions, names, totals
+    HEADER = struct.Struct("<4sI10q")
+
+    @classmethod
+    def get_file(cls, db_file: DbFile) -> DbFile:
+        return DbFile(db_file.get_path() + cls.FILE_NAME_SUFFIX)
+
+    @staticmethod
+    def _column(typecode: str, buffer, position: int, count: int) -> array:
+        column = array(typecode)
+        column.frombytes(buffer[position : position + count * column.itemsize])
+
+        if sys.byteorder == "big":
+            column.byteswap()
+
+        return column
+
+    @staticmethod
+    def _strings(blob: bytes, offsets: array) -> list[str]:
+        text = blob.decode("utf-8")
+        return [text[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    @classmethod
+    def load(cls, db_file: DbFile) -> LedgerSnapshot | None:
+        try:
+            with open(cls.get_file(db_file).get_path(), "rb") as file:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                    with memoryview(view) as buffer:
+                        return cls._parse(buffer)
+        except (FileNotFoundError, ValueError, struct.error):
+            return None
+
+    @classmethod
+    def _parse(cls, buffer) -> LedgerSnapshot | None:
+        (
+            magic,
+            version,
+            mtime_ns,
+            size,
+            inode,
+            offset,
+            rows_read,
+            rows,
+            category_count,
+            descriptions_length,
+            names_length,
+            totals_length,
+        ) = cls.HEADER.unpack_from(buffer, 0)
+
+        if magic != cls.MAGIC or version != cls.VERSION:
+            return None
+
+        expected = (
+            cls.HEADER.size
+            + 24 * rows
+            + 8 * (rows + 1)
+            + 8 * (category_count + 1)
+            + descriptions_length
+            + names_length
+            + totals_length
+        )
+        if len(buffer) != expected:
+            return None
+
+        position = cls.HEADER.size
+        columns = []
+
+        for typecode, count in (
+            ("q", rows),
+            ("d", rows),
+            ("i", rows),
+            ("I", rows),
+            ("q", rows + 1),
+            ("q", category_count + 1),
+        ):
+            column = cls._column(typecode, buffer, position, count)
+            position += column.itemsize * count
+            columns.append(column)
+
+        timestamps, amounts, dates, categories, description_offsets, name_offsets = (
+            columns
+        )
+
+        blobs = []
+        for length in (descriptions_length, names_length, totals_length):
+            blobs.append(bytes(buffer[position : position + length]))
+            position += length
+
+        descriptions, names, totals = blobs
+        totals = json.loads(totals)
+
+        return LedgerSnapshot(
+            signature=(mtime_ns, size, inode),
+            offset=offset,
+            rows_read=rows_read,
+            timestamps=timestamps,
+            dates=dates,
+            amounts=amounts,
+            categories=categories,
+            descriptions=cls._strings(descriptions, description_offsets),
+            category_names=cls._strings(names, name_offsets),
+            utc_offsets={
+                int(index): offset for index, offset in totals["utc_offsets"].items()
+            },
+            initial_balance=totals["initial_balance"],
+            totals=totals["totals"],
+        )
+
+    @staticmethod
+    def _offsets(strings: list[str]) -> array:
+        # Runs on every append, kept free of per row Python code
+        return array("q", accumulate(map(len, strings), initial=0))
+
+    @classmethod
+    def store(cls, db_file: DbFile, snapshot: LedgerSnapshot) -> None:
+        descriptions = "".join(snapshot.descriptions).encode("utf-8")
+        names = "".join(snapshot.category_names).encode("utf-8")
+        totals = json.dumps(
+            {
+                "initial_balance": snapshot.initial_balance,
+                "totals": snapshot.totals,
+                "utc_offsets": snapshot.utc_offsets,
+            }
+        ).encode()
+
+        columns = [
+            snapshot.timestamps,
+            snapshot.amounts,
+            snapshot.dates,
+            snapshot.categories,
+            cls._offsets(snapshot.descriptions),
+            cls._offsets(snapshot.category_names),
+        ]
+
+        if sys.byteorder == "big":
+            columns = [array(column.typecode, column) for column in columns]
+            for column in columns:
+                column.byteswap()
+
+        header = cls.HEADER.pack(
+            cls.MAGIC,
+            cls.VERSION,
+            *snapshot.signature,
+            snapshot.offset,
+            snapshot.rows_read,
+            len(snapshot.timestamps),
+            len(snapshot.category_names),
+            len(descriptions),
+            len(names),
+            len(totals),
+        )
+
+        cls.get_file(db_file).replace_content(
+            b"".join(
+                [
+                    header,
+                    *(column.tobytes() for column in columns),
+                    descriptions,
+                    names,
+                    totals,
+                ]
+            )
+        )
@@ -0,0 +1,94 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .user import User
+
+
+class LoginWorkerPool:
+    """Runs password checks on a few dedicated threads.
+
+    Password hashes are slow on purpose, bounding how many are computed at
+    once leaves the remaining cores to everything else. Checks beyond
+    max_queue waiting ones are refused instead of piling up.
+
+    Each check also blocks the request thread that waits for it, so workers
+    plus max_queue are kept below the server's threads, leaving at least one
+    of them free for other requests while logins are flooded.
+    """
+
+    DEFAULT_WORKERS = 2
+    DEFAULT_MAX_QUEUE = 1
+    # Waitress serves requests on 4 threads by default
+    DEFAULT_SERVER_THREADS = 4
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        server_threads: int = DEFAULT_SERVER_THREADS,
+    ):
+        self._lock = threading.Lock()
+        self._executor = None
+        # Checks submitted and not finished, and those of them being computed
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self.configure(workers, max_queue, server_threads)
+
+    def configure(
+        self,
+        workers: int,
+        max_queue: int,
+        server_threads: int = DEFAULT_SERVER_THREADS,
+    ) -> None:
+        # With a single server thread one check has to be allowed anyway
+        blocking_limit = max(1, server_threads - 1)
+
+        with self._lock:
+            previous = self._executor
+            self._workers = min(max(1, workers), blocking_limit)
+            self._max_queue = min(max(0, max_queue), blocking_limit - self._workers)
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._workers, thread_name_prefix="login"
+            )
+
+        if previous is not None:
+            previous.shutdown(wait=False)
+
+    def check_password(self, user: User, password: str) -> bool | None:
+        """Blocks until checked, None when the pool is saturated."""
+        with self._lock:
+            if self._pending >= self._workers + self._max_queue:
+                self._rejected += 1
+                return None
+
+            self._pending += 1
+            executor = self._executor
+
+        try:
+            return executor.submit(self._check, user, password).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._completed += 1
+
+    def _check(self, user: User, password: str) -> bool:
+        with self._lock:
+            self._running += 1
+
+        try:
+            return user.check_password(password)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self._workers,
+                "max_queue": self._max_queue,
+                "queued": self._pending - self._running,
+                "running": self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
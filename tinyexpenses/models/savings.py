@@ -1,5 +1,4 @@
-import csv
-from .file import DbFile, DbCSVReader
+from .file import DbFile, DbCSVReader, DbCSVAtomicWriter
 from enum import Enum
 from collections import defaultdict
 
@@ -64,16 +63,17 @@ class Savings:
                         f"Cannot parse: {self._db_file.get_file_name()}:{row + 1} - {reason}."
                     )
 
-                if saving_record.category in self._by_category:
-                    self._by_category[
-                        saving_record.category
-                    ].balance += saving_record.balance
-                else:
-                    self._by_category[saving_record.category] = saving_record
+                self._index(saving_record)
 
-                self._by_account[saving_record.account][saving_record.category] = (
-                    saving_record
-                )
+    def _index(self, saving_record: SavingRecord) -> None:
+        if saving_record.category in self._by_category:
+            self._by_category[saving_record.category].balance += saving_record.balance
+        else:
+            self._by_category[saving_record.category] = saving_record
+
+        self._by_account[saving_record.account][saving_record.category] = (
+            saving_record
+        )
 
     def _sum_per_account(self):
         for account, savings in self._by_account.items():
@@ -154,16 +154,24 @@ class Savings:
         record.account = account
         self._by_account[account][category] = record
 
+    def replace(self, records: list[SavingRecord]) -> None:
+        self._by_category.clear()
+        self._by_account.clear()
+        self._account_totals.clear()
+
+        for record in records:
+            self._index(record)
+
+        self._sum_per_account()
+
+    def get_records(self) -> list[SavingRecord]:
+        return [
+            record for savings in self._by_account.values() for record in savings.values()
+        ]
+
     def store(self):
-        self._db_file.backup()
-        self._db_file.erase()
-
-        try:
-            with open(self._db_file.get_path(), mode="w", newline="") as file:
-                writer = csv.writer(file)
-                for savings in self._by_account.values():
-                    for record in savings.values():
-                        writer.writerow(record.serialize())
-        except Exception as e:
-            self._db_file.restore()
-            raise e
+        with DbCSVAtomicWriter(
+            self._db_file, SavingRecord.Columns.labels()
+        ) as writer:
+            for record in self.get_records():
+                writer.write(record.serialize())
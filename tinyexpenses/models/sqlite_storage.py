@@ -0,0 +1,533 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date
+from typing import Callable
+from .expenses import (
+    ExpenseFilter,
+    ExpenseRecord,
+    YearExpensesReport,
+    YearExpensesSummary,
+    YearExpensesTotals,
+)
+from .savings import Savings, SavingRecord
+from .categories import CategoryRecord, CategoryType, YearCategories
+from .file import DbFile
+from .storage import Storage
+
+
+class SqliteYearExpensesReport(YearExpensesReport):
+    """A year read from SQLite, refreshed by reading only rows past the last id."""
+
+    def __init__(self, storage: "SqliteStorage", year: int):
+        self._storage = storage
+        self._year = year
+
+        super().__init__(None)
+
+    def _reset(self) -> None:
+        super()._reset()
+        self._generation: int | None = None
+        self._last_id: int = 0
+
+    def _load_expenses(self) -> None:
+        generation, rows = self._storage.read_expenses(self._year, self._last_id)
+
+        for row_id, *line in rows:
+            self._fold_expense(ExpenseRecord(*line))
+            self._last_id = row_id
+
+        self._generation = generation
+
+    def refresh(self) -> None:
+        with self._lock:
+            generation, last_id = self._storage.get_expenses_version(self._year)
+            if (generation, last_id) == (self._generation, self._last_id):
+                return
+
+            # Any rewrite of the year bumps the generation, appends never do
+            if generation != self._generation:
+                self._reset()
+
+            try:
+                self._load_expenses()
+            except Exception:
+                self._reset()
+                raise
+
+    def store_summary(self) -> None:
+        # Summaries are aggregated by the database on demand
+        pass
+
+    def get_path(self) -> str:
+        return self._storage.get_year_key(self._year)
+
+    def insert_expense(self, expenses: ExpenseRecord | list[ExpenseRecord]) -> None:
+        if not isinstance(expenses, list):
+            expenses = [expenses]
+
+        with self._lock:
+            self._storage.insert_expenses(self._year, expenses)
+            self.refresh()
+
+
+class SqliteYearCategories(YearCategories):
+    def __init__(self, storage: "SqliteStorage", year: int):
+        self._storage = storage
+        self._year = year
+
+        super().__init__(None)
+
+    def _load_categories(self) -> None:
+        for line in self._storage.read_categories(self._year):
+            self._index(CategoryRecord(*line))
+
+    def _store(self, categories: list[CategoryRecord]) -> None:
+        self._storage.store_year_categories(self._year, categories)
+
+
+class SqliteSavings(Savings):
+    def __init__(self, storage: "SqliteStorage"):
+        self._storage = storage
+
+        super().__init__(None)
+
+    def _load_savings(self):
+        for line in self._storage.read_savings():
+            self._index(SavingRecord(*line))
+
+    def store(self):
+        self._storage.store_savings(self.get_records())
+
+
+class SqliteStorage(Storage):
+    """All years of a user in one SQLite database next to the user's config.
+
+    Range, month and category filters as well as the yearly summaries run as
+    indexed queries instead of full CSV scans.
+    """
+
+    NAME = "sqlite"
+    STABLE_ROW_IDS = True
+    DB_FILE_NAME = "ledger.sqlite3"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS years (
+            year INTEGER PRIMARY KEY,
+            has_expenses INTEGER NOT NULL DEFAULT 0,
+            has_categories INTEGER NOT NULL DEFAULT 0,
+            generation INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY,
+            year INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            category TEXT NOT NULL,
+            expense_date TEXT NOT NULL,
+            amount REAL NOT NULL,
+            description TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS expenses_year_category
+            ON expenses (year, category);
+        CREATE INDEX IF NOT EXISTS expenses_expense_date ON expenses (expense_date);
+        CREATE INDEX IF NOT EXISTS expenses_timestamp ON expenses (timestamp);
+        CREATE TABLE IF NOT EXISTS categories (
+            year INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            category_type TEXT NOT NULL,
+            PRIMARY KEY (year, category)
+        );
+        CREATE TABLE IF NOT EXISTS savings (
+            position INTEGER PRIMARY KEY,
+            category TEXT NOT NULL,
+            account TEXT NOT NULL,
+            balance REAL NOT NULL
+        );
+    """
+
+    def __init__(self, app_path: str, expenses_cache=None):
+        super().__init__(app_path, expenses_cache)
+
+        self._db_path = os.path.join(app_path, self.DB_FILE_NAME)
+        # sqlite3 connections must stay on the thread that opened them
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            os.makedirs(self._app_path, exist_ok=True)
+
+            connection = sqlite3.connect(
+                self._db_path, timeout=30, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            # SQLite's own lower() only folds ASCII
+            connection.create_function(
+                "contains_text",
+                2,
+                lambda text, part: part in text.casefold(),
+                deterministic=True,
+            )
+            connection.executescript(self.SCHEMA)
+            self._local.connection = connection
+
+        return connection
+
+    @contextmanager
+    def _transaction(self, write: bool = True):
+        connection = self._connect()
+
+        if connection.in_transaction:
+            yield connection
+            return
+
+        # IMMEDIATE takes the write lock up front, so read-modify-write
+        # sequences of other processes wait instead of failing
+        connection.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        connection.execute("COMMIT")
+
+    def _get_years(self, column: str) -> list[int]:
+        if not os.path.exists(self._db_path):
+            return []
+
+        rows = self._connect().execute(
+            f"SELECT year FROM years WHERE {column} ORDER BY year"
+        )
+        return [year for (year,) in rows]
+
+    def _has_year(self, connection: sqlite3.Connection, year: int, column: str):
+        row = connection.execute(
+            f"SELECT {column} FROM years WHERE year = ?", (year,)
+        ).fetchone()
+
+        return row is not None and bool(row[0])
+
+    def _mark_year(self, connection: sqlite3.Connection, year: int, column: str):
+        connection.execute(
+            f"""INSERT INTO years (year, {column}) VALUES (?, 1)
+                ON CONFLICT (year) DO UPDATE SET {column} = 1""",
+            (year,),
+        )
+
+    def _require_year(self, connection: sqlite3.Connection, year: int, column: str):
+        if not self._has_year(connection, year, column):
+            raise FileNotFoundError(
+                f"Year {year} does not exist in {self._db_path} ({column})."
+            )
+
+    def _get_signatures(self) -> list[tuple[int, int, int] | None]:
+        # Commits land in the WAL until a checkpoint moves them to the database
+        return [
+            DbFile(self._db_path).stat_signature(),
+            DbFile(self._db_path + "-wal").stat_signature(),
+        ]
+
+    def get_year_signatures(self, year: int) -> list[tuple[int, int, int] | None]:
+        return self._get_signatures()
+
+    def get_savings_signatures(self) -> list[tuple[int, int, int] | None]:
+        return self._get_signatures()
+
+    def get_year_key(self, year: int) -> str:
+        return f"{self._db_path}#{year}"
+
+    def get_expenses_years(self) -> list[int]:
+        return self._get_years("has_expenses")
+
+    def get_categories_years(self) -> list[int]:
+        return self._get_years("has_categories")
+
+    def has_year_expenses(self, year: int) -> bool:
+        return self._has_year(self._connect(), year, "has_expenses")
+
+    def has_year_categories(self, year: int) -> bool:
+        return self._has_year(self._connect(), year, "has_categories")
+
+    def get_expenses_version(self, year: int) -> tuple[int, int]:
+        with self._transaction(write=False) as connection:
+            return self._get_expenses_version(connection, year)
+
+    def _get_expenses_version(self, connection: sqlite3.Connection, year: int):
+        row = connection.execute(
+            "SELECT has_expenses, generation FROM years WHERE year = ?", (year,)
+        ).fetchone()
+
+        if row is None or not row[0]:
+            raise FileNotFoundError(
+                f"Year {year} does not exist in {self._db_path} (has_expenses)."
+            )
+
+        (last_id,) = connection.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM expenses WHERE year = ?", (year,)
+        ).fetchone()
+
+        return row[1], last_id
+
+    def read_expenses(self, year: int, after_id: int = 0) -> tuple[int, list]:
+        # One read transaction, so the generation describes exactly these rows
+        with self._transaction(write=False) as connection:
+            generation, _ = self._get_expenses_version(connection, year)
+
+            rows = connection.execute(
+                """SELECT id, timestamp, category, expense_date, amount, description
+                   FROM expenses WHERE year = ? AND id > ? ORDER BY id""",
+                (year, after_id),
+            ).fetchall()
+
+        return generation, rows
+
+    @staticmethod
+    def _expense_row(year: int, expense: ExpenseRecord) -> tuple:
+        return (
+            year,
+            expense.timestamp.isoformat(),
+            expense.category,
+            expense.expense_date.isoformat(),
+            expense.amount,
+            expense.description,
+        )
+
+    def insert_expenses(self, year: int, expenses: list[ExpenseRecord]) -> None:
+        with self._transaction() as connection:
+            self._require_year(connection, year, "has_expenses")
+
+            connection.executemany(
+                """INSERT INTO expenses
+                   (year, timestamp, category, expense_date, amount, description)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                [self._expense_row(year, expense) for expense in expenses],
+            )
+
+    def get_year_expenses(self, year: int) -> YearExpensesReport:
+        return self._get_cached_report(
+            self.get_year_key(year), lambda: SqliteYearExpensesReport(self, year)
+        )
+
+    def get_year_summary(self, year: int) -> YearExpensesSummary | YearExpensesReport:
+        if self._expenses_cache is not None:
+            report = self._expenses_cache.get_cached(
+                self.get_year_key(year), lambda: SqliteYearExpensesReport(self, year)
+            )
+            if report is not None:
+                return report
+
+        with self._transaction(write=False) as connection:
+            self._require_year(connection, year, "has_expenses")
+
+            totals: dict[str, YearExpensesTotals] = {}
+            rows = connection.execute(
+                """SELECT category, CAST(strftime('%m', expense_date) AS INTEGER),
+                          SUM(amount)
+                   FROM expenses WHERE year = ? GROUP BY 1, 2""",
+                (year,),
+            )
+            for category, month, amount in rows:
+                totals.setdefault(category, YearExpensesTotals())[month - 1] = amount
+
+            # The last Initial Balance row wins, as when folding the rows in order
+            row = connection.execute(
+                """SELECT amount FROM expenses WHERE year = ? AND category = ?
+                   ORDER BY id DESC LIMIT 1""",
+                (year, CategoryType.INITIAL_BALANCE_LABEL.value),
+            ).fetchone()
+
+        return YearExpensesSummary(0.0 if row is None else row[0], totals)
+
+    def query_expenses(
+        self,
+        year: int,
+        date_from: date | None = None,
+        date_to: date | None = None,
+        category: str | None = None,
+    ) -> list[ExpenseRecord]:
+        query = """SELECT timestamp, category, expense_date, amount, description
+                   FROM expenses WHERE year = ?"""
+        parameters: list = [year]
+
+        if date_from is not None:
+            query += " AND expense_date >= ?"
+            parameters.append(date_from.isoformat())
+
+        if date_to is not None:
+            query += " AND expense_date < ?"
+            parameters.append(date_to.isoformat())
+
+        if category is not None:
+            query += " AND category = ?"
+            parameters.append(category)
+
+        with self._transaction(write=False) as connection:
+            self._require_year(connection, year, "has_expenses")
+            rows = connection.execute(query + " ORDER BY id", parameters).fetchall()
+
+        return [ExpenseRecord(*row) for row in rows]
+
+    def list_expenses(
+        self,
+        year: int,
+        expense_filter: ExpenseFilter,
+        after: int = -1,
+        limit: int = 100,
+    ) -> list[tuple[int, ExpenseRecord]]:
+        query = """SELECT id, timestamp, category, expense_date, amount, description
+                   FROM expenses WHERE year = ? AND id > ?"""
+        parameters: list = [year, after]
+
+        for condition, value, convert in (
+            ("expense_date >= ?", expense_filter.date_from, date.isoformat),
+            ("expense_date < ?", expense_filter.date_to, date.isoformat),
+            ("category = ?", expense_filter.category, str),
+            ("amount >= ?", expense_filter.amount_min, float),
+            ("amount <= ?", expense_filter.amount_max, float),
+            ("contains_text(description, ?)", expense_filter.text, str.casefold),
+        ):
+            if value is not None:
+                query += f" AND {condition}"
+                parameters.append(convert(value))
+
+        with self._transaction(write=False) as connection:
+            self._require_year(connection, year, "has_expenses")
+
+            rows = connection.execute(
+                query + " ORDER BY id LIMIT ?", [*parameters, limit]
+            ).fetchall()
+
+        return [(row_id, ExpenseRecord(*line)) for row_id, *line in rows]
+
+    def modify_expense(
+        self,
+        year: int,
+        row: int,
+        change: Callable[[ExpenseRecord], ExpenseRecord | None],
+    ) -> ExpenseRecord | None:
+        with self._transaction() as connection:
+            self._require_year(connection, year, "has_expenses")
+
+            line = connection.execute(
+                """SELECT timestamp, category, expense_date, amount, description
+                   FROM expenses WHERE year = ? AND id = ?""",
+                (year, row),
+            ).fetchone()
+
+            if line is None:
+                raise KeyError(row)
+
+            replacement = change(ExpenseRecord(*line))
+
+            if replacement is None:
+                connection.execute("DELETE FROM expenses WHERE id = ?", (row,))
+            else:
+                connection.execute(
+                    """UPDATE expenses SET timestamp = ?, category = ?,
+                       expense_date = ?, amount = ?, description = ? WHERE id = ?""",
+                    [*self._expense_row(year, replacement)[1:], row],
+                )
+
+            # Cached reports fold rows by id, only a new generation reloads them
+            connection.execute(
+                "UPDATE years SET generation = generation + 1 WHERE year = ?", (year,)
+            )
+
+        return replacement
+
+    def create_year_expenses(self, year: int) -> None:
+        with self._transaction() as connection:
+            if self._has_year(connection, year, "has_expenses"):
+                raise FileExistsError(f"Year {year} already exists in {self._db_path}.")
+
+            self._mark_year(connection, year, "has_expenses")
+
+    def store_year_expenses(self, year: int, expenses: list[ExpenseRecord]) -> None:
+        with self._transaction() as connection:
+            self._require_year(connection, year, "has_expenses")
+
+            connection.execute("DELETE FROM expenses WHERE year = ?", (year,))
+            connection.executemany(
+                """INSERT INTO expenses
+                   (year, timestamp, category, expense_date, amount, description)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                [self._expense_row(year, expense) for expense in expenses],
+            )
+            connection.execute(
+                "UPDATE years SET generation = generation + 1 WHERE year = ?", (year,)
+            )
+
+    def read_categories(self, year: int) -> list[tuple[str, str]]:
+        with self._transaction(write=False) as connection:
+            self._require_year(connection, year, "has_categories")
+
+            return connection.execute(
+                """SELECT category, category_type FROM categories
+                   WHERE year = ? ORDER BY position""",
+                (year,),
+            ).fetchall()
+
+    def get_year_categories(self, year: int) -> YearCategories:
+        return SqliteYearCategories(self, year)
+
+    def create_year_categories(self, year: int, template_year: int | None = None):
+        with self._transaction() as connection:
+            if self._has_year(connection, year, "has_categories"):
+                raise FileExistsError(f"Year {year} already exists in {self._db_path}.")
+
+            if template_year is not None:
+                self._require_year(connection, template_year, "has_categories")
+
+                connection.execute(
+                    """INSERT INTO categories (year, position, category, category_type)
+                       SELECT ?, position, category, category_type FROM categories
+                       WHERE year = ?""",
+                    (year, template_year),
+                )
+
+            self._mark_year(connection, year, "has_categories")
+
+    def store_year_categories(self, year: int, categories: list[CategoryRecord]):
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM categories WHERE year = ?", (year,))
+            connection.executemany(
+                """INSERT INTO categories (year, position, category, category_type)
+                   VALUES (?, ?, ?, ?)""",
+                [
+                    (year, position, record.category, record.category_type.value)
+                    for position, record in enumerate(categories)
+                ],
+            )
+            self._mark_year(connection, year, "has_categories")
+
+    def read_savings(self) -> list[tuple[str, str, float]]:
+        with self._transaction(write=False) as connection:
+            return connection.execute(
+                "SELECT category, account, balance FROM savings ORDER BY position"
+            ).fetchall()
+
+    def get_savings(self) -> Savings:
+        return SqliteSavings(self)
+
+    @contextmanager
+    def update_savings(self):
+        with self._transaction():
+            savings = SqliteSavings(self)
+            yield savings
+            savings.store()
+
+    def store_savings(self, records: list[SavingRecord]) -> None:
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM savings")
+            connection.executemany(
+                """INSERT INTO savings (position, category, account, balance)
+                   VALUES (?, ?, ?, ?)""",
+                [
+                    (position, record.category, record.account, record.balance)
+                    for position, record in enumerate(records)
+                ],
+            )
@@ -0,0 +1,268 @@
+import re
+import csv
+import tomllib
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Iterable, Iterator
+from .accounts import AppUser
+from .categories import CategoryType, YearCategories
+from .expenses import (
+    ExpenseRecord,
+    YearExpensesReport,
+    parse_amount,
+    parse_expense_date,
+    round_amount,
+)
+
+
+@dataclass
+class StatementEntry:
+    expense_date: date
+    # Signed as on the statement, negative for money leaving the account
+    amount: float
+    description: str
+
+
+def _parse_statement_amount(value: str) -> float:
+    return parse_amount(value.replace(" ", "").replace("\xa0", ""))
+
+
+def read_csv_statement(
+    path: str,
+    date_column: str,
+    amount_column: str,
+    description_column: str,
+    delimiter: str = ",",
+    date_format: str | None = None,
+) -> Iterator[StatementEntry]:
+    with open(path, mode="r", newline="", encoding="utf-8-sig") as file:
+        for row in csv.DictReader(file, delimiter=delimiter):
+            raw_date = row[date_column].strip()
+
+            if date_format is None:
+                expense_date = parse_expense_date(raw_date)
+            else:
+                expense_date = datetime.strptime(raw_date, date_format).date()
+
+            yield StatementEntry(
+                expense_date=expense_date,
+                amount=_parse_statement_amount(row[amount_column]),
+                description=row[description_column].strip(),
+            )
+
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+def read_ofx_statement(path: str) -> Iterator[StatementEntry]:
+    # OFX 1.x is SGML with optional closing tags, so walk the tag stream
+    # instead of loading a document tree
+    transaction = None
+
+    with open(path, mode="r", encoding="utf-8", errors="replace") as file:
+        for line in file:
+            for closing, tag, value in _OFX_TAG.findall(line):
+                tag = tag.upper()
+                value = value.strip()
+
+                if tag == "STMTTRN":
+                    if closing and transaction is not None:
+                        yield StatementEntry(
+                            expense_date=datetime.strptime(
+                                transaction["DTPOSTED"][:8], "%Y%m%d"
+                            ).date(),
+                            amount=_parse_statement_amount(transaction["TRNAMT"]),
+                            description=transaction.get("NAME", "")
+                            or transaction.get("MEMO", ""),
+                        )
+                        transaction = None
+                    elif not closing:
+                        transaction = {}
+                elif transaction is not None and not closing and value:
+                    transaction[tag] = value
+
+
+class CategoryRules:
+    """Maps statement descriptions to categories, first matching rule wins.
+
+    rules.toml:
+        default = "Other"           # optional, unmatched rows are skipped without it
+
+        [[rule]]
+        match = "(?i)grocery|market"
+        category = "Food"
+    """
+
+    def __init__(self, rules: list[tuple[re.Pattern, str]], default: str | None):
+        self._rules = rules
+        self._default = default
+
+    @classmethod
+    def load(cls, path: str) -> "CategoryRules":
+        with open(path, "rb") as file:
+            data = tomllib.load(file)
+
+        rules = [
+            (re.compile(rule["match"]), rule["category"])
+            for rule in data.get("rule", [])
+        ]
+
+        return cls(rules, data.get("default", None))
+
+    def match(self, description: str) -> str | None:
+        for pattern, category in self._rules:
+            if pattern.search(description):
+                return category
+
+        return self._default
+
+
+def map_categories(
+    entries: Iterable[StatementEntry], rules: CategoryRules, stats: Counter
+) -> Iterator[tuple[StatementEntry, str]]:
+    for entry in entries:
+        category = rules.match(entry.description)
+
+        if category is None:
+            stats["unmatched"] += 1
+            continue
+
+        yield entry, category
+
+
+def expense_key(expense: ExpenseRecord) -> tuple:
+    return (
+        expense.expense_date,
+        round(expense.amount * 100),
+        expense.category,
+        expense.description,
+    )
+
+
+class YearImportTarget:
+    """Per-year state of an import: the loaded report and what it already holds."""
+
+    def __init__(self, report: YearExpensesReport, categories: YearCategories):
+        self.report = report
+        self.category_types = categories.get_type_by_category()
+        # Multiset, so a row repeated in the ledger absorbs as many imports
+        self.existing = Counter(map(expense_key, report.get_expenses()))
+
+    def to_expense(self, entry: StatementEntry, category: str, timestamp: datetime):
+        # Money leaving the account is a positive expense, refunds go negative
+        if self.category_types.get(category) == CategoryType.INCOME:
+            amount = entry.amount
+        else:
+            amount = -entry.amount
+
+        return ExpenseRecord(
+            timestamp=timestamp,
+            category=category,
+            expense_date=entry.expense_date,
+            amount=round_amount(amount),
+            description=entry.description,
+        )
+
+
+class YearImportTargets:
+    """Loads an import target the first time a year shows up in the statement."""
+
+    def __init__(self, user: AppUser):
+        self.user = user
+        self._targets: dict[int, YearImportTarget | None] = {}
+
+    def get(self, year: int) -> YearImportTarget | None:
+        if year not in self._targets:
+            try:
+                self._targets[year] = YearImportTarget(
+                    self.user.get_year_expenses(year),
+                    self.user.get_year_categories(year),
+                )
+            except FileNotFoundError:
+                self._targets[year] = None
+
+        return self._targets[year]
+
+
+def to_expenses(
+    mapped: Iterable[tuple[StatementEntry, str]],
+    targets: YearImportTargets,
+    stats: Counter,
+) -> Iterator[tuple[int, ExpenseRecord]]:
+    timestamp = datetime.now()
+
+    for entry, category in mapped:
+        target = targets.get(entry.expense_date.year)
+
+        if target is None:
+            stats["missing_year"] += 1
+            continue
+
+        if category not in target.category_types:
+            stats["unknown_category"] += 1
+            continue
+
+        yield entry.expense_date.year, target.to_expense(entry, category, timestamp)
+
+
+def dedupe(
+    expenses: Iterable[tuple[int, ExpenseRecord]],
+    targets: YearImportTargets,
+    stats: Counter,
+) -> Iterator[tuple[int, ExpenseRecord]]:
+    for year, expense in expenses:
+        existing = targets.get(year).existing
+        key = expense_key(expense)
+
+        if existing[key] > 0:
+            existing[key] -= 1
+            stats["duplicate"] += 1
+            continue
+
+        yield year, expense
+
+
+def write_batches(
+    expenses: Iterable[tuple[int, ExpenseRecord]],
+    targets: YearImportTargets,
+    batch_size: int,
+    stats: Counter,
+    dry_run: bool = False,
+) -> Iterator[Counter]:
+    """Appends in batches per year, yields the running stats after each flush.
+
+    Rows go through the same path as API appends, savings categories also
+    move the balances in the savings.
+    """
+
+    batches: dict[int, list[ExpenseRecord]] = {}
+
+    def flush(year: int):
+        batch = batches.pop(year)
+
+        if not dry_run:
+            target = targets.get(year)
+            targets.user.append_expenses(year, target.report, batch)
+
+            savings_deltas = defaultdict(float)
+            for expense in batch:
+                if target.category_types[expense.category] == CategoryType.SAVINGS:
+                    savings_deltas[expense.category] += expense.amount
+
+            if savings_deltas:
+                targets.user.add_to_savings(savings_deltas)
+
+        stats["imported"] += len(batch)
+
+    for year, expense in expenses:
+        batches.setdefault(year, []).append(expense)
+
+        if len(batches[year]) >= batch_size:
+            flush(year)
+            yield stats
+
+    for year in list(batches):
+        flush(year)
+
+    yield stats
@@ -0,0 +1,394 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date
+from typing import Callable
+from .file import DbFile
+from .expenses import (
+    ExpenseFilter,
+    ExpenseRecord,
+    YearExpensesReport,
+    YearExpensesSummary,
+)
+from .savings import Savings, SavingRecord
+from .categories import YearCategories, CategoryRecord
+
+
+class YearExpensesCache:
+    """Process-wide LRU of parsed year reports, shared by all request threads."""
+
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self._lock = threading.Lock()
+        self._max_bytes = max_bytes
+        self._reports: OrderedDict[str, YearExpensesReport] = OrderedDict()
+        self._footprints: dict[str, int] = {}
+        self._total_bytes = 0
+
+    def set_max_bytes(self, max_bytes: int) -> None:
+        with self._lock:
+            self._max_bytes = max_bytes
+            self._evict()
+
+    def get_cached(
+        self, path: str, load: Callable[[], YearExpensesReport]
+    ) -> YearExpensesReport | None:
+        with self._lock:
+            if path not in self._reports:
+                return None
+
+        return self.get(path, load)
+
+    def get(self, path: str, load: Callable[[], YearExpensesReport]) -> YearExpensesReport:
+        with self._lock:
+            report = self._reports.get(path, None)
+            if report is not None:
+                self._reports.move_to_end(path)
+
+        if report is None:
+            # Parse outside of the lock, other users must not wait for it
+            report = load()
+        else:
+            try:
+                report.refresh()
+            except Exception:
+                self.invalidate(path)
+                raise
+
+        with self._lock:
+            cached = self._reports.get(path, None)
+            if cached is not None and cached is not report:
+                # Another thread has won the race, keep a single instance
+                report = cached
+
+            self._reports[path] = report
+            self._reports.move_to_end(path)
+            self._account(path, report.get_memory_footprint())
+            self._evict()
+
+        return report
+
+    def invalidate(self, path: str) -> None:
+        with self._lock:
+            if self._reports.pop(path, None) is not None:
+                self._total_bytes -= self._footprints.pop(path)
+
+    def _account(self, path: str, footprint: int) -> None:
+        self._total_bytes += footprint - self._footprints.get(path, 0)
+        self._footprints[path] = footprint
+
+    def _evict(self) -> None:
+        # The most recently used report always stays, even when over budget
+        while self._total_bytes > self._max_bytes and len(self._reports) > 1:
+            path, _ = self._reports.popitem(last=False)
+            self._total_bytes -= self._footprints.pop(path)
+
+
+class Storage:
+    """Where a user's years, categories and savings live.
+
+    AppUser talks only to this interface, the backend is picked with the
+    STORAGE_BACKEND config key. Missing years raise FileNotFoundError and
+    creating an existing one raises FileExistsError, whatever the backend.
+    """
+
+    NAME = ""
+    # Whether a row id still names the same row after other rows are deleted
+    STABLE_ROW_IDS = False
+
+    def __init__(self, app_path: str, expenses_cache: YearExpensesCache | None = None):
+        self._app_path = app_path
+        self._expenses_cache = expenses_cache
+
+    def get_expenses_years(self) -> list[int]:
+        raise NotImplementedError()
+
+    def get_categories_years(self) -> list[int]:
+        raise NotImplementedError()
+
+    def has_year_expenses(self, year: int) -> bool:
+        raise NotImplementedError()
+
+    def has_year_categories(self, year: int) -> bool:
+        raise NotImplementedError()
+
+    def get_year_expenses(self, year: int) -> YearExpensesReport:
+        raise NotImplementedError()
+
+    def get_year_summary(self, year: int) -> YearExpensesSummary | YearExpensesReport:
+        raise NotImplementedError()
+
+    def query_expenses(
+        self,
+        year: int,
+        date_from: date | None = None,
+        date_to: date | None = None,
+        category: str | None = None,
+    ) -> list[ExpenseRecord]:
+        """Expenses of the year with date_from <= expense date < date_to."""
+        raise NotImplementedError()
+
+    def list_expenses(
+        self,
+        year: int,
+        expense_filter: ExpenseFilter,
+        after: int = -1,
+        limit: int = 100,
+    ) -> list[tuple[int, ExpenseRecord]]:
+        """Up to limit matching (row id, expense) pairs with ids above after, by id."""
+        raise NotImplementedError()
+
+    def modify_expense(
+        self,
+        year: int,
+        row: int,
+        change: Callable[[ExpenseRecord], ExpenseRecord | None],
+    ) -> ExpenseRecord | None:
+        """Replaces a row with what change returns for it, None deletes the row.
+
+        change runs while the year is locked against other writers and may
+        raise to abort. Unknown row ids raise KeyError.
+        """
+        raise NotImplementedError()
+
+    def create_year_expenses(self, year: int) -> None:
+        raise NotImplementedError()
+
+    def store_year_expenses(self, year: int, expenses: list[ExpenseRecord]) -> None:
+        raise NotImplementedError()
+
+    def get_year_categories(self, year: int) -> YearCategories:
+        raise NotImplementedError()
+
+    def create_year_categories(self, year: int, template_year: int | None = None):
+        raise NotImplementedError()
+
+    def store_year_categories(self, year: int, categories: list[CategoryRecord]):
+        raise NotImplementedError()
+
+    def get_savings(self) -> Savings:
+        raise NotImplementedError()
+
+    def update_savings(self):
+        """Context manager yielding the savings, stored back when the block succeeds."""
+        raise NotImplementedError()
+
+    def store_savings(self, records: list[SavingRecord]) -> None:
+        raise NotImplementedError()
+
+    def get_year_signatures(self, year: int) -> list[tuple[int, int, int] | None]:
+        """Stat signatures that change whenever the year's expenses or categories do."""
+        raise NotImplementedError()
+
+    def get_savings_signatures(self) -> list[tuple[int, int, int] | None]:
+        raise NotImplementedError()
+
+    def _get_cached_report(
+        self, key: str, load: Callable[[], YearExpensesReport]
+    ) -> YearExpensesReport:
+        if self._expenses_cache is None:
+            return load()
+
+        return self._expenses_cache.get(key, load)
+
+
+class CsvStorage(Storage):
+    """One directory per year with CSV files, the files users can edit by hand."""
+
+    NAME = "csv"
+    EXPENSES_FILE_NAME = "expenses.csv"
+    CATEGORIES_FILE_NAME = "categories.csv"
+    SAVINGS_FILE_NAME = "savings.csv"
+
+    def _get_years(self, file_name: str) -> list[int]:
+        if not os.path.exists(self._app_path):
+            return []
+
+        available_years = []
+
+        for entry in os.scandir(self._app_path):
+            if entry.is_dir() and entry.name.isdigit():
+                if self._get_year_file(entry.name, file_name).exists():
+                    available_years.append(int(entry.name))
+
+        return sorted(available_years)
+
+    def _get_year_file(self, year: str | int, file_name: str) -> DbFile:
+        return DbFile(
+            os.path.join(self._app_path, str(year), file_name),
+            lock_across_processes=True,
+        )
+
+    def _get_year_expenses_file(self, year: str | int) -> DbFile:
+        return self._get_year_file(year, self.EXPENSES_FILE_NAME)
+
+    def _get_year_categories_file(self, year: str | int) -> DbFile:
+        return self._get_year_file(year, self.CATEGORIES_FILE_NAME)
+
+    def _get_savings_file(self) -> DbFile:
+        return DbFile(
+            os.path.join(self._app_path, self.SAVINGS_FILE_NAME),
+            lock_across_processes=True,
+        )
+
+    def get_expenses_years(self) -> list[int]:
+        return self._get_years(self.EXPENSES_FILE_NAME)
+
+    def get_categories_years(self) -> list[int]:
+        return self._get_years(self.CATEGORIES_FILE_NAME)
+
+    def has_year_expenses(self, year: int) -> bool:
+        return self._get_year_expenses_file(year).exists()
+
+    def has_year_categories(self, year: int) -> bool:
+        return self._get_year_categories_file(year).exists()
+
+    def get_year_expenses(self, year: int) -> YearExpensesReport:
+        db_file = self._get_year_expenses_file(year)
+
+        return self._get_cached_report(
+            db_file.get_path(), lambda: YearExpensesReport(db_file)
+        )
+
+    def get_year_summary(self, year: int) -> YearExpensesSummary | YearExpensesReport:
+        db_file = self._get_year_expenses_file(year)
+
+        # A resident report is cheaper than reading the sidecar
+        if self._expenses_cache is not None:
+            report = self._expenses_cache.get_cached(
+                db_file.get_path(), lambda: YearExpensesReport(db_file)
+            )
+            if report is not None:
+                return report
+
+        summary = YearExpensesSummary.load(db_file)
+        if summary is not None:
+            return summary
+
+        report = self.get_year_expenses(year)
+        report.store_summary()
+
+        return report
+
+    def query_expenses(
+        self,
+        year: int,
+        date_from: date | None = None,
+        date_to: date | None = None,
+        category: str | None = None,
+    ) -> list[ExpenseRecord]:
+        return [
+            expense
+            for expense in self.get_year_expenses(year).get_expenses()
+            if (date_from is None or expense.expense_date >= date_from)
+            and (date_to is None or expense.expense_date < date_to)
+            and (category is None or expense.category == category)
+        ]
+
+    def list_expenses(
+        self,
+        year: int,
+        expense_filter: ExpenseFilter,
+        after: int = -1,
+        limit: int = 100,
+    ) -> list[tuple[int, ExpenseRecord]]:
+        # Row ids are positions in the file
+        return self.get_year_expenses(year).list_expenses(expense_filter, after, limit)
+
+    def modify_expense(
+        self,
+        year: int,
+        row: int,
+        change: Callable[[ExpenseRecord], ExpenseRecord | None],
+    ) -> ExpenseRecord | None:
+        return self.get_year_expenses(year).modify_expense(row, change)
+
+    def create_year_expenses(self, year: int) -> None:
+        self._get_year_expenses_file(year).create()
+
+    def store_year_expenses(self, year: int, expenses: list[ExpenseRecord]) -> None:
+        YearExpensesReport.store(self._get_year_expenses_file(year), expenses)
+
+    def get_year_categories(self, year: int) -> YearCategories:
+        return YearCategories(self._get_year_categories_file(year))
+
+    def create_year_categories(self, year: int, template_year: int | None = None):
+        categories_file = self._get_year_categories_file(year)
+
+        if template_year is None:
+            categories_file.create()
+        else:
+            template_file = self._get_year_categories_file(template_year)
+            categories_file.copy_from(template_file.get_path())
+
+    def store_year_categories(self, year: int, categories: list[CategoryRecord]):
+        YearCategories.store(self._get_year_categories_file(year), categories)
+
+    def get_savings(self) -> Savings:
+        return Savings(self._get_savings_file())
+
+    @contextmanager
+    def update_savings(self):
+        db_file = self._get_savings_file()
+
+        with db_file.write_lock():
+            savings = Savings(db_file)
+            yield savings
+            savings.store()
+
+    def store_savings(self, records: list[SavingRecord]) -> None:
+        with self.update_savings() as savings:
+            savings.replace(records)
+
+    def get_year_signatures(self, year: int) -> list[tuple[int, int, int] | None]:
+        return [
+            self._get_year_expenses_file(year).stat_signature(),
+            self._get_year_categories_file(year).stat_signature(),
+        ]
+
+    def get_savings_signatures(self) -> list[tuple[int, int, int] | None]:
+        return [self._get_savings_file().stat_signature()]
+
+
+def get_storage_class(name: str) -> type[Storage]:
+    if name == CsvStorage.NAME:
+        return CsvStorage
+
+    if name == "sqlite":
+        # Imported lazily, the SQLite backend builds on this module
+        from .sqlite_storage import SqliteStorage
+
+        return SqliteStorage
+
+    raise ValueError(f"Unknown storage backend: {name}.")
+
+
+def copy_storage(source: Storage, target: Storage) -> dict[str, int]:
+    """Copies every year and the savings, target years are overwritten."""
+    copied = {"categories": 0, "expenses": 0, "savings": 0}
+
+    for year in source.get_categories_years():
+        categories = source.get_year_categories(year).get_categories()
+
+        if not target.has_year_categories(year):
+            target.create_year_categories(year)
+
+        target.store_year_categories(year, categories)
+        copied["categories"] += len(categories)
+
+    for year in source.get_expenses_years():
+        expenses = source.get_year_expenses(year).get_expenses()
+
+        if not target.has_year_expenses(year):
+            target.create_year_expenses(year)
+
+        target.store_year_expenses(year, expenses)
+        copied["expenses"] += len(expenses)
+
+    records = source.get_savings().get_records()
+    target.store_savings(records)
+    copied["savings"] = len(records)
+
+    return copied
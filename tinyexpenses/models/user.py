@@ -2,26 +2,33 @@ import os
 import tomllib
 import tomli_w
 import flask_login
+from contextlib import contextmanager
 from .file import DbFile
 from werkzeug.security import check_password_hash, generate_password_hash
 
 
 class Config:
     CONFIG_FILE_NAME = "config.toml"
+    # werkzeug method for new hashes, hashes made with another one are redone on login
+    PASSWORD_HASH_METHOD = "scrypt"
+    _password_hash_prefix = None
 
     def __init__(self, db_file) -> None:
         self._db_file = DbFile(os.path.join(db_file, Config.CONFIG_FILE_NAME))
         self._data = self._load()
-
-        if self._data.get("user", None) is None:
-            self._data["user"] = {
+        # Nesting depth of update() blocks, saves are deferred while non zero
+        self._updating = 0
+        self._dirty = False
+
+        # Missing sections are filled in memory only, the file is written on change
+        self._base_config = self._data.setdefault(
+            "user",
+            {
                 "username": "",
                 "full_name": "",
                 "password_hash": "",
-            }
-            self._save()
-
-        self._base_config = self._data["user"]
+            },
+        )
 
     def _load(self) -> dict:
         if not self._db_file.exists():
@@ -30,13 +37,32 @@ class Config:
             return tomllib.load(f)
 
     def _save(self) -> None:
-        with open(self._db_file.get_path(), "wb") as f:
-            tomli_w.dump(self._data, f)
+        if self._updating:
+            self._dirty = True
+            return
+
+        self._db_file.replace_content(tomli_w.dumps(self._data).encode("utf-8"))
+
+    @contextmanager
+    def update(self):
+        """Groups setters into a single atomic write of the file on exit."""
+        self._updating += 1
+        try:
+            yield self
+        finally:
+            self._updating -= 1
+
+        if self._updating == 0 and self._dirty:
+            self._dirty = False
+            self._save()
 
     def set_username(self, username):
         self._base_config["username"] = username
         self._save()
 
+    def stat_signature(self) -> tuple[int, int, int] | None:
+        return self._db_file.stat_signature()
+
     def get_username(self) -> str:
         return self._base_config["username"]
 
@@ -50,19 +76,45 @@ class Config:
     def get_password_hash(self) -> str:
         return self._base_config["password_hash"]
 
+    @classmethod
+    def set_password_hash_method(cls, method: str) -> None:
+        # Hashing a dummy expands defaults, "scrypt" is stored as "scrypt:32768:8:1"
+        Config._password_hash_prefix = generate_password_hash("", method).split("$")[0]
+        Config.PASSWORD_HASH_METHOD = method
+
+    @staticmethod
+    def _get_password_hash_prefix() -> str:
+        if Config._password_hash_prefix is None:
+            Config.set_password_hash_method(Config.PASSWORD_HASH_METHOD)
+
+        return Config._password_hash_prefix
+
+    def needs_rehash(self) -> bool:
+        return (
+            self.get_password_hash().split("$")[0] != self._get_password_hash_prefix()
+        )
+
     def check_password(self, password: str) -> bool:
-        return check_password_hash(self.get_password_hash(), password)
+        if not check_password_hash(self.get_password_hash(), password):
+            return False
+
+        # The plain password is only known here, upgrade outdated hashes now
+        if self.needs_rehash():
+            self.set_password(password)
+
+        return True
 
     def set_password(self, password: str):
-        self._base_config["password_hash"] = generate_password_hash(password)
+        self._base_config["password_hash"] = generate_password_hash(
+            password, self.PASSWORD_HASH_METHOD
+        )
         self._save()
 
     def change_password(self, current_password: str, new_password: str) -> bool:
-        if not self.check_password(current_password):
+        if not check_password_hash(self.get_password_hash(), current_password):
             return False
 
-        self._base_config["password_hash"] = generate_password_hash(new_password)
-        self._save()
+        self.set_password(new_password)
 
         return True
 
@@ -105,5 +157,11 @@ class User(flask_login.UserMixin):
     def set_full_name(self, name: str):
         self._config.set_full_name(name)
 
+    def update_config(self):
+        return self._config.update()
+
+    def get_config_signature(self) -> tuple[int, int, int] | None:
+        return self._config.stat_signature()
+
     def get_id(self):
         return self.id
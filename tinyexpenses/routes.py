@@ -1,16 +1,24 @@
 from datetime import datetime
 from flask import request, render_template, redirect, url_for, jsonify
-from flask_login import login_required
+from flask_login import current_user, login_required
 from functools import wraps
 from werkzeug import Response
 from .expenses_view import expenses_view_year_get, expenses_view_month_get, expenses_view_balance_api_get
+from .expenses_summary import expenses_summary_get, expenses_summary_api_get
 from .expenses_append import (
     expenses_append_get,
     expenses_append_post,
-    expenses_append_api_put
+    expenses_append_api_put,
+    expenses_append_batch_api_put,
 )
 from .expenses_create import expenses_create_get, expenses_create_post
 from .expenses_edit import expenses_edit_get, expenses_edit_post
+from .expenses_rows import (
+    expenses_rows_api_get,
+    expenses_row_api_patch,
+    expenses_row_api_delete,
+    expenses_rows_edit_get,
+)
 from .extensions import bp, users_db, login_manager, csrf, app
 from .auth import auth_authenticate_post, auth_logout
 from .categories_create import categories_create_post, categories_create_get
@@ -50,7 +58,9 @@ def api_key_required(view_function):
         if x_api_key is None:
             return jsonify({"status": "Unauthorized"}), 401
 
-        if verify_user_token(x_api_key) is None:
+        user_token = verify_user_token(x_api_key)
+
+        if user_token is None or not user.check_token(user_token):
             return jsonify({"status": "Unauthorized"}), 401
 
         return view_function(*args, **kwargs)
@@ -144,6 +154,13 @@ def expenses_append():
 def expenses_append_api(username):
     return expenses_append_api_put(username)
 
+
+@bp.route("/api/v1/<username>/expenses/append/batch", methods=("PUT", "POST"))
+@api_key_required
+@csrf.exempt
+def expenses_append_batch_api(username):
+    return expenses_append_batch_api_put(username)
+
 @bp.route("/api/v1/<username>/expenses/view/balance/<int:year>", methods=("GET",))
 @api_key_required
 @csrf.exempt
@@ -151,10 +168,50 @@ def expenses_view_balance_api(username, year):
     return expenses_view_balance_api_get(username, year)
 
 
+@bp.route("/api/v1/<username>/expenses/summary", methods=("GET",))
+@api_key_required
+@csrf.exempt
+def expenses_summary_api(username):
+    return expenses_summary_api_get(username)
+
+
+@bp.route("/api/v1/<username>/expenses/<int:year>", methods=("GET",))
+@api_key_required
+@csrf.exempt
+def expenses_rows_api(username, year):
+    return expenses_rows_api_get(username, year)
+
+
+@bp.route(
+    "/api/v1/<username>/expenses/<int:year>/<int:row>", methods=("PATCH", "DELETE")
+)
+@api_key_required
+@csrf.exempt
+def expenses_row_api(username, year, row):
+    if request.method == "PATCH":
+        return expenses_row_api_patch(username, year, row)
+
+    return expenses_row_api_delete(username, year, row)
+
+
 @bp.route("/expenses/edit/<int:year>", methods=("GET", "POST"))
 @handle_uncaught_exceptions
 @login_required
 def expenses_edit(year: int):
+    # Bulk edits posted by older pages still land here
+    if request.method == "POST":
+        return expenses_edit_post(int(year))
+
+    if request.method == "GET":
+        return expenses_rows_edit_get(int(year))
+
+    return render_template("404.html")
+
+
+@bp.route("/expenses/edit/<int:year>/csv", methods=("GET", "POST"))
+@handle_uncaught_exceptions
+@login_required
+def expenses_edit_csv(year: int):
     if request.method == "POST":
         return expenses_edit_post(int(year))
 
@@ -164,6 +221,23 @@ def expenses_edit(year: int):
     return render_template("404.html")
 
 
+@bp.route("/expenses/edit/<int:year>/rows", methods=("GET",))
+@handle_uncaught_exceptions
+@login_required
+def expenses_rows(year: int):
+    return expenses_rows_api_get(current_user.id, year)
+
+
+@bp.route("/expenses/edit/<int:year>/rows/<int:row>", methods=("PATCH", "DELETE"))
+@handle_uncaught_exceptions
+@login_required
+def expenses_row(year: int, row: int):
+    if request.method == "PATCH":
+        return expenses_row_api_patch(current_user.id, year, row)
+
+    return expenses_row_api_delete(current_user.id, year, row)
+
+
 @bp.route("/expenses/view/<int:year>/<int:month>", methods=("GET", "POST"))
 @handle_uncaught_exceptions
 @login_required
@@ -182,6 +256,13 @@ def expenses_view_year(year: int | None):
     return expenses_view_year_get(int(year))
 
 
+@bp.route("/expenses/summary", methods=("GET",))
+@handle_uncaught_exceptions
+@login_required
+def expenses_summary():
+    return expenses_summary_get()
+
+
 @bp.route("/categories/edit/<int:year>", methods=("GET", "POST"))
 @handle_uncaught_exceptions
 @login_required
@@ -73,11 +73,8 @@ def _handle_withdraw_post():
         flash("Request could not be validated.", FlashType.ERROR.name)
         return redirect(url_for("main.savings_view"))
 
-    savings = requested_user.get_savings()
-
-    savings.update(form.category.data, form.account.data, form.balance.data)
-
-    savings.store()
+    with requested_user.update_savings() as savings:
+        savings.update(form.category.data, form.account.data, form.balance.data)
 
     flash(f"Edit of '{form.category.data}' succeed!", FlashType.INFO.name)
 
@@ -1,4 +1,5 @@
-from flask import render_template, get_flashed_messages
+import time
+from flask import current_app, render_template, get_flashed_messages, session
 from flask_login import current_user
 from flask_wtf import FlaskForm
 from wtforms import (
@@ -9,6 +10,7 @@ from .models.accounts import AppUser
 from .models.savings import Savings
 from .models.flash import flash_collect
 from .extensions import users_db
+from . import http_cache
 from collections import defaultdict
 
 
@@ -20,12 +22,33 @@ class SavingRecordForm(FlaskForm):
     submit_withdraw = SubmitField("Withdraw")
 
 
+def _get_csrf_window():
+    # The page embeds CSRF tokens, a cached copy must not outlive half their validity
+    time_limit = current_app.config.get("WTF_CSRF_TIME_LIMIT", 3600)
+    field_name = current_app.config.get("WTF_CSRF_FIELD_NAME", "csrf_token")
+
+    window = None if not time_limit else int(time.time() // (time_limit / 2))
+
+    return session.get(field_name, None), window
+
+
 def savings_view_get():
     requested_user: AppUser | None = users_db.get(current_user.id)
 
     if requested_user is None:
         return render_template("error.html", message="User not found.")
 
+    validators = http_cache.get_validators(
+        requested_user.get_savings_signatures()
+        + [requested_user.get_config_signature()],
+        requested_user.id,
+        "savings",
+        _get_csrf_window(),
+    )
+    # Pending flashes are shown by this page, a cached copy would swallow them
+    if not session.get("_flashes") and http_cache.is_not_modified(validators):
+        return http_cache.not_modified_response(validators)
+
     savings = requested_user.get_savings()
 
     savings_by_category_form = defaultdict(dict)
@@ -36,7 +59,7 @@ def savings_view_get():
         savings_by_category_form[saving.category].balance.data = str(saving.balance)
         savings_by_category_form[saving.category].account.data = saving.account
 
-    return render_template(
+    page = render_template(
         "savings_view.html",
         savings_by_account=savings.get_savings_by_account(),
         savings_by_category_form=savings_by_category_form,
@@ -44,3 +67,4 @@ def savings_view_get():
         currency=requested_user.currency,
         infos=flash_collect(),
     )
+    return http_cache.with_validators(page, validators)
@@ -10,7 +10,7 @@ from wtforms import (
     ValidationError,
 )
 from .models.accounts import AppUser
-from .models.expenses import ExpenseRecord
+from .models.expenses import ExpenseRecord, round_amount
 from .models.categories import CategoryRecord, CategoryType
 from .extensions import users_db
 from .savings_view import SavingRecordForm
@@ -91,9 +91,7 @@ def _handle_withdraw_post():
         flash("Request could not be validated.", FlashType.ERROR.name)
         return redirect(url_for("main.savings_view"))
 
-    savings = requested_user.get_savings()
-
-    withdrawed_amount = float(form.amount.data)
+    withdrawed_amount = round_amount(form.amount.data)
 
     saving_transfer = ExpenseRecord(
         timestamp=datetime.now().isoformat(),
@@ -103,14 +101,11 @@ def _handle_withdraw_post():
         description=f"Transfer of savings from {form.category.data}",
     )
 
-    saving_record = savings.get_by_category()[form.category.data]
-    saving_record.balance -= withdrawed_amount
-
-    savings.update(form.category.data, None, saving_record.balance)
-    savings.store()
+    with requested_user.update_savings() as savings:
+        saving_record = savings.get_by_category()[form.category.data]
+        saving_record.balance -= withdrawed_amount
 
-    year_expenses = requested_user.get_year_expenses(form.year_select.data)
-    year_expenses.insert_expense(saving_transfer)
+        savings.update(form.category.data, None, saving_record.balance)
 
     year_categories = requested_user.get_year_categories(form.year_select.data)
 
@@ -118,6 +113,12 @@ def _handle_withdraw_post():
 
     year_categories.insert_category(new_saving_category)
 
+    # After the category, so the views recomputed on the append know it
+    year_expenses = requested_user.get_year_expenses(form.year_select.data)
+    requested_user.append_expenses(
+        form.year_select.data, year_expenses, saving_transfer
+    )
+
     flash(f"Withdraw from '{form.category.data}' succeed!", FlashType.INFO.name)
 
     return redirect(url_for("main.savings_view"))
@@ -0,0 +1,179 @@
+/**
+ * @file expenses_editor.js
+ * @copyright Copyright (c) 2024 mmyalski. All rights reserved.
+ * @description Loads expenses page by page through the rows API and saves or removes single rows, sending only the changed cells.
+ */
+
+const TABLE_ID = "csv-view";
+const FILTER_FORM_ID = "expenses-filter";
+const MORE_BUTTON_ID = "expenses-more";
+const DATA_CELL_CLASS = "data";  // class for editable <td>
+const FIELDS = ["timestamp", "category", "expense_date", "amount", "description"];
+
+const table = document.getElementById(TABLE_ID);
+const rowsUrl = table.dataset.rowsUrl;
+const csrfToken = table.dataset.csrfToken;
+
+const pager = {
+    query: "",
+    cursor: null
+};
+
+function formatCell(field, value) {
+    return field === "amount" ? Number(value).toFixed(2) : String(value);
+}
+
+function renderRow(expense) {
+    const row = document.createElement("tr");
+    row.dataset.id = expense.id;
+    row.dataset.etag = expense.etag;
+
+    const numberCell = document.createElement("td");
+    numberCell.className = "row-number-cell";
+    row.appendChild(numberCell);
+
+    FIELDS.forEach(field => {
+        const cell = document.createElement("td");
+        cell.className = DATA_CELL_CLASS;
+        cell.contentEditable = "true";
+        cell.dataset.field = field;
+        cell.dataset.original = formatCell(field, expense[field]);
+        cell.textContent = cell.dataset.original;
+        row.appendChild(cell);
+    });
+
+    [["[save]", saveRow], ["[-]", deleteRow]].forEach(([label, handler]) => {
+        const cell = document.createElement("td");
+        cell.className = "button";
+        const button = document.createElement("input");
+        button.type = "button";
+        button.value = label;
+        button.addEventListener("click", () => handler(row));
+        cell.appendChild(button);
+        row.appendChild(cell);
+    });
+
+    return row;
+}
+
+async function loadRows() {
+    const params = new URLSearchParams(pager.query);
+    if (pager.cursor !== null) {
+        params.set("cursor", pager.cursor);
+    }
+
+    const response = await fetch(`${rowsUrl}?${params}`, { credentials: "same-origin" });
+    const body = await response.json();
+
+    if (!response.ok) {
+        alert(body.status);
+        return;
+    }
+
+    const tbody = table.querySelector("tbody");
+    body.expenses.forEach(expense => tbody.appendChild(renderRow(expense)));
+
+    pager.cursor = body.next_cursor;
+    document.getElementById(MORE_BUTTON_ID).hidden = pager.cursor === null;
+}
+
+function reloadRows() {
+    table.querySelector("tbody").replaceChildren();
+    pager.cursor = null;
+
+    return loadRows();
+}
+
+function sendRow(row, method, body) {
+    const headers = {
+        "If-Match": row.dataset.etag,
+        "X-CSRFToken": csrfToken
+    };
+
+    if (body !== undefined) {
+        headers["Content-Type"] = "application/json";
+    }
+
+    return fetch(`${rowsUrl}/${row.dataset.id}`, {
+        method: method,
+        credentials: "same-origin",
+        headers: headers,
+        body: body === undefined ? undefined : JSON.stringify(body)
+    });
+}
+
+async function handleFailure(response) {
+    const body = await response.json();
+
+    if (response.status === 412) {
+        // Someone else changed the row, show the stored version
+        alert(body.status);
+        await reloadRows();
+        return;
+    }
+
+    alert(body.status);
+}
+
+async function saveRow(row) {
+    const changes = {};
+
+    row.querySelectorAll(`td.${DATA_CELL_CLASS}`).forEach(cell => {
+        const value = cell.textContent.trim();
+        if (value !== cell.dataset.original) {
+            changes[cell.dataset.field] = value;
+        }
+    });
+
+    if (Object.keys(changes).length === 0) {
+        return;
+    }
+
+    const response = await sendRow(row, "PATCH", changes);
+
+    if (!response.ok) {
+        await handleFailure(response);
+        return;
+    }
+
+    const body = await response.json();
+    row.replaceWith(renderRow(body.expense));
+}
+
+async function deleteRow(row) {
+    if (!confirm("Remove this expense?")) {
+        return;
+    }
+
+    const response = await sendRow(row, "DELETE");
+
+    if (!response.ok) {
+        await handleFailure(response);
+        return;
+    }
+
+    // Rows of CSV files are numbered by position, later ids shift on removal
+    await reloadRows();
+}
+
+window.addEventListener("DOMContentLoaded", () => {
+    const form = document.getElementById(FILTER_FORM_ID);
+
+    form.addEventListener("submit", event => {
+        event.preventDefault();
+
+        const params = new URLSearchParams();
+        new FormData(form).forEach((value, key) => {
+            if (value !== "") {
+                params.set(key, value);
+            }
+        });
+
+        pager.query = params.toString();
+        reloadRows();
+    });
+
+    document.getElementById(MORE_BUTTON_ID).addEventListener("click", loadRows);
+
+    loadRows();
+});
@@ -1,21 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
 from itsdangerous import URLSafeSerializer, BadSignature, SignatureExpired
 from flask import current_app
 
+# Verified keys are remembered so hot API clients skip the HMAC check
+VERIFIED_TOKENS_MAX_ITEMS = 1024
+VERIFIED_TOKENS_TTL = 300.0
+
+_serializer: URLSafeSerializer | None = None
+_serializer_secret = None
+_verified_tokens: OrderedDict[str, tuple[float, str]] = OrderedDict()
+_verified_tokens_lock = threading.Lock()
+
+
 def _get_serializer() -> URLSafeSerializer:
-    """Creates a serializer using Flask's SECRET_KEY"""
-    return URLSafeSerializer(
-        secret_key=current_app.config["SECRET_KEY"]
-    )
+    """Returns the serializer for Flask's SECRET_KEY, rebuilt only when it changes"""
+    global _serializer, _serializer_secret
+
+    secret_key = current_app.config["SECRET_KEY"]
+
+    if _serializer is None or _serializer_secret != secret_key:
+        # Keys verified under the old secret are no longer valid
+        with _verified_tokens_lock:
+            _verified_tokens.clear()
+
+        _serializer = URLSafeSerializer(secret_key=secret_key)
+        _serializer_secret = secret_key
+
+    return _serializer
+
+
+def configure_verified_tokens(max_items: int, ttl: float) -> None:
+    global VERIFIED_TOKENS_MAX_ITEMS, VERIFIED_TOKENS_TTL
+
+    with _verified_tokens_lock:
+        VERIFIED_TOKENS_MAX_ITEMS = max(0, max_items)
+        VERIFIED_TOKENS_TTL = max(0.0, ttl)
+        _verified_tokens.clear()
+
 
 def generate_user_token(user_token: str) -> str:
     """Generates a signed token tied to both the Flask secret and user token."""
     s = _get_serializer()
     return s.dumps(user_token)
 
-def verify_user_token(token: str) -> dict | None:
-    """Verifies a signed token using Flask secret and user token as salt."""
+
+def verify_user_token(token: str) -> str | None:
+    """Verifies a signed token, returns the user token it was generated from."""
     s = _get_serializer()
+    now = time.monotonic()
+
+    with _verified_tokens_lock:
+        cached = _verified_tokens.get(token, None)
+
+        if cached is not None:
+            if cached[0] > now:
+                _verified_tokens.move_to_end(token)
+                return cached[1]
+
+            del _verified_tokens[token]
+
     try:
-        return s.loads(token)
+        user_token = s.loads(token)
     except (BadSignature, SignatureExpired):
         return None
+
+    if not isinstance(user_token, str):
+        return None
+
+    with _verified_tokens_lock:
+        if VERIFIED_TOKENS_MAX_ITEMS > 0:
+            _verified_tokens[token] = (now + VERIFIED_TOKENS_TTL, user_token)
+            _verified_tokens.move_to_end(token)
+
+            while len(_verified_tokens) > VERIFIED_TOKENS_MAX_ITEMS:
+                _verified_tokens.popitem(last=False)
+
+    return user_token